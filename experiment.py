@@ -1,68 +1,70 @@
-# Import qmap
-from mqt import qmap
+# qmap, qiskit and the helpers built on them are imported by the subcommands
+# using them, so the others start without paying for those imports
 
 # Import graph libraries ( :)
 # import networkx as nx
 # import rustworkx as rx
 
-# Import
-import qiskit
-
 # Import miscellaneous helper functions
 from misc.timing import time_it
-from misc.random_qc import random_circuit
-from misc.graph_to_arch import graph_to_architecture, normalize_graph, edge_view
 
 # Import algorithmic and architecture functions
 import lib.architectures as arch
 import lib.algorithm as alg
+from lib import instrumentation
 
 # Import csv for saving measured data
 import csv
 
 
-# Run using Q-synth
-def q_synth(architecture_name, circuitfile, platform_size, filename, qsynth_dir, full=True):
+# Write the counters and stage timers of this run next to its results
+def write_report(filename, command, **meta):
+    path = instrumentation.report_path(filename)
+    instrumentation.dump(path, command=command, **meta)
+    print(f"Wrote run report to {path}")
 
-    # Import module for calling q_synth and io for string printing
-    import subprocess
-    import io
-    import os
 
-    print(f"Starting testing for {circuitfile}")
-    print(f"Starting to compute maximal subarchitectures for {architecture_name} with {platform_size} qubits")
+# Map circuits onto coupling maps over jobs processes, each distinct pair only once
+def run_mappings(circuits, mapping_jobs, jobs, persist=False):
+    from misc.mapping import map_all, MappingCache
+    from lib.resultstore import ResultStore
 
-    # Compute platform sub-architectures
-    architecture = arch.architecture[architecture_name]()
-    platform_size = int(platform_size)
-    subarchitectures = alg.size_k_optimal_subgraphs_slow(architecture, platform_size)
-    if full is not None:
-        full = full.strip().tolower() == 'true'
-    else:
-        full = True
+    cache = MappingCache(ResultStore() if persist else None)
+    with instrumentation.timed("mapping wall"):
+        results = map_all(circuits, mapping_jobs, jobs, cache)
 
-    print(f"Computed {len(subarchitectures)} maximal subarchitectures")
+    print(f"Mapped {cache.misses} distinct jobs, {len(mapping_jobs) - cache.misses} taken from cache")
 
-    working_dir = os.getcwd()
+    return results
 
-    # Read all outputs
-    outlines = []
 
+# Run using Q-synth
+def q_synth(architecture_name, circuitfile, platform_size, filename, qsynth_dir, full='true', workers=None, jobs=None, timeout=None, memory=None, stop_on_zero='false'):
+
+    # Import module for running Q-Synth jobs
+    from misc.jobrunner import Job, run_jobs
+    from misc.qsynth import zero_swaps
 
-    # Map to each sub-architecture
-    for sarcht in subarchitectures:
+    print(f"Starting testing for {circuitfile}")
+    print(f"Starting to compute maximal subarchitectures for {architecture_name} with {platform_size} qubits")
 
-        sarch = edge_view(sarcht, bidirectional=False)
+    # Compute platform sub-architectures
+    architecture = arch.build_architecture(architecture_name)
+    platform_size = int(platform_size)
+    workers = None if workers is None else int(workers)
+    subarchitectures = alg.size_k_optimal_subarchitectures_cached(architecture, platform_size, workers=workers)
+    full = str(full).strip().lower() == 'true'
+    jobs = 1 if jobs is None else int(jobs)
+    timeout = None if timeout is None else float(timeout)
+    memory = None if memory is None else int(memory)
+    stop_on_zero = stop_on_zero.strip().lower() == 'true'
 
-        # Get subarchitecture as edge list string in "edges"
-        el = list(sarch)
-        buf = io.StringIO()
-        print(el, file=buf, end="")
-        edges = buf.getvalue()
-        buf.close()
+    print(f"Computed {len(subarchitectures)} maximal subarchitectures")
 
-        # Pass to Q-synth
-        args = [
+    # Build the Q-Synth command for a coupling graph given as an edge list.
+    # Jobs run in qsynth_dir, so the circuit file is relative to that directory
+    def qsynth_args(el):
+        return [
             ".venv/bin/python3.11",
             "q-synth.py",
             "-b1",  # bidirectional
@@ -71,63 +73,43 @@ def q_synth(architecture_name, circuitfile, platform_size, filename, qsynth_dir,
             "sat",  # use sat solving
             "-p",
             "test",  # Specify that the platform is provided
-            f"--coupling_graph={edges}",  # provide coupling graph
+            f"--coupling_graph={el}",  # provide coupling graph
             "-v0",  # high verbosity
             "-s",
             "cd15",  # cd15 solver
             circuitfile
         ]
 
-        print()
-        print(args)
-        print()
-
-        # Run Q-Synth
-        os.chdir(qsynth_dir)
-        proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        outlines.append(proc.stdout)
-        os.chdir(working_dir)
-
-        print("="*60)
-
-
-    # Perform mapping to full platform
-    # Get subarchitecture as edge list string in "edges"
-    el = list(architecture.edges())
-    buf = io.StringIO()
-    print(el, file=buf, end="")
-    edges = buf.getvalue()
-    buf.close()
-
-    # Pass to Q-synth
-    args = [
-        ".venv/bin/python3.11",
-        "q-synth.py",
-        "-b1",  # bidirectional
-        "-a0",  # no ancillaries
-        "-m",
-        "sat",  # use sat solving
-        "-p",
-        "test",  # Specify that the platform is provided
-        f"--coupling_graph={edges}",  # provide coupling graph
-        "-v0",  # high verbosity
-        "-s",
-        "cd15",  # cd15 solver
-        circuitfile
-    ]
-
+    # One job per sub-architecture
+    qsynth_jobs = []
+    for idx, sarcht in enumerate(subarchitectures):
+        el = list(sarcht.to_edge_list())
+        qsynth_jobs.append(Job(qsynth_args(el), cwd=qsynth_dir, name=f"subarchitecture {idx}"))
 
+    # Perform mapping to full platform as well
     if full:
-        print()
-        print(args)
-        print()
-
-        # Run Q-Synth
-        os.chdir(qsynth_dir)
-        proc = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        outlines.append(proc.stdout)
-        os.chdir(working_dir)
+        el = list(architecture.edges())
+        qsynth_jobs.append(Job(qsynth_args(el), cwd=qsynth_dir, name="full platform"))
+
+    print(f"Running {len(qsynth_jobs)} Q-Synth jobs, {jobs} at a time")
+
+    with instrumentation.timed("mapping"):
+        results = run_jobs(
+            qsynth_jobs,
+            workers=jobs,
+            timeout=timeout,
+            memory_mb=memory,
+            # Nothing beats a mapping without SWAPs, so it may end the search
+            stop_when=(lambda result: zero_swaps(result.output)) if stop_on_zero else None,
+        )
+    instrumentation.count("mappings", sum(1 for r in results if r.status != "cancelled"))
 
+    # Read all outputs
+    outlines = []
+    for result in results:
+        print(result.job.name, result.status, f"in {result.seconds:.2f}s")
+        outlines.append(f"{result.job.name}: {result.status} in {result.seconds}s\n")
+        outlines.append(result.output)
 
     # Print results and write to file
     with open(filename, "a+") as f:
@@ -138,12 +120,19 @@ def q_synth(architecture_name, circuitfile, platform_size, filename, qsynth_dir,
     for line in outlines:
         print(line)
 
+    write_report(filename, "qsynth", architecture=architecture_name, circuit=circuitfile, platform_size=platform_size)
+
 
 # Specific circuit from qasm file
-def opt_qasm(architecture_name, circuitfile, filename, ancillaries=None):
+def opt_qasm(architecture_name, circuitfile, filename, ancillaries=None, workers=None, jobs=None, persist='false'):
+
+    from mqt import qmap
+    import qiskit
+    from misc.graph_to_arch import graph_to_architecture
+    from misc.mapping import coupling_of_covering_graph
 
     # Parse arguments
-    architecture = arch.architecture[architecture_name]()
+    architecture = arch.build_architecture(architecture_name)
     qc = qiskit.QuantumCircuit.from_qasm_file(circuitfile)
     circuit_size = len(qc.qubits)
     qmap_architecture = graph_to_architecture(architecture)
@@ -153,24 +142,24 @@ def opt_qasm(architecture_name, circuitfile, filename, ancillaries=None):
     else:
         ancillaries = int(ancillaries)
 
+    workers = None if workers is None else int(workers)
+    jobs = None if jobs is None else int(jobs)
+    persist = persist.strip().lower() == 'true'
+
     subarchitecture_size = circuit_size + ancillaries
 
     # Helper functions for some stuff
     def comp_opt_subarch():
-        return alg.size_k_optimal_subgraphs_slow(architecture, subarchitecture_size)
+        return alg.size_k_optimal_subarchitectures_cached(architecture, subarchitecture_size, workers=workers)
 
     def comp_subarch_order():
-        return qmap.SubarchitectureOrder.from_qmap_architecture(qmap_architecture)
+        with instrumentation.timed("subarchitecture order"):
+            return qmap.SubarchitectureOrder.from_qmap_architecture(qmap_architecture)
 
     def comp_opt_cov(order, size):
         def fun():
-            return order.covering(circuit_size, size)
-        return fun
-
-    def comp_opt_mapping(qc, arch):
-        def fun():
-            comp = qmap.compile(qc, arch, method="exact", post_mapping_optimizations=False)
-            return comp[1].json()["statistics"]
+            with instrumentation.timed("covering"):
+                return order.covering(circuit_size, size)
         return fun
 
     print(f"Testing fixed fixed circuit {circuitfile} on {architecture_name} with {circuit_size} qubits in circuit and {subarchitecture_size} qubits on architecture")
@@ -195,31 +184,36 @@ def opt_qasm(architecture_name, circuitfile, filename, ancillaries=None):
 
         print(f"Computed covering of size {size} in {cov_t}s")
 
-    # Map circuit to our subarchitectures first
+    # Map circuit to our subarchitectures and to each covering, all at once
+    mapping_jobs = [(0, subarch.to_coupling()) for subarch in optsubarch]
+    for covering in coverings:
+        mapping_jobs += [(0, coupling_of_covering_graph(subarch)) for subarch in covering]
+
+    print(f"Starting {len(mapping_jobs)} mappings")
+
+    mapped = iter(run_mappings([qc], mapping_jobs, jobs, persist))
+
+    # Collect mappings to our subarchitectures first
     sub = None
     sub_t = 0.0
     for subarch in optsubarch:
-        archt = graph_to_architecture(subarch)
-        mp, mp_t = time_it(comp_opt_mapping(qc, archt))
+        mp, mp_t = next(mapped)
         sub_t += mp_t
         if sub is None or mp["additional_gates"] < sub:
             sub = mp["additional_gates"]
 
     print(f"Mapped to all subarchitectures with {sub} in {sub_t}s")
 
-    # Map circuit to each covering of each size
+    # Collect mappings to each covering of each size
     coveringmp = []
     coveringmp_t = []
     for size, covering in enumerate(coverings, start=1):
 
-        print(f"Starting mapping to size {size} covering")
-
-        # Map circuit to each subarchitecture in covering
+        # Collect mappings to each subarchitecture in covering
         cov = None
         cov_t = 0.0
         for subarch in covering:
-            archt = qmap.Architecture(len(subarch.nodes()), set(subarch.edge_list()))
-            mp, mp_t = time_it(comp_opt_mapping(qc, archt))
+            mp, mp_t = next(mapped)
             cov_t += mp_t
             if cov is None or mp["additional_gates"] < cov:
                 cov = mp["additional_gates"]
@@ -268,14 +262,24 @@ def opt_qasm(architecture_name, circuitfile, filename, ancillaries=None):
             row_3 += [coveringmp[idx], coveringmp_t[idx]]
         writer.writerow(row_1 + row_2 + row_3)
 
+    write_report(filename, "fixedcircuit", architecture=architecture_name, circuit=circuitfile, subarchitecture_size=subarchitecture_size)
+
 
 # Random circuit optimality
-def opt_random(architecture_name, circuit_size, subarchitecture_size, filename, reps=1):
+def opt_random(architecture_name, circuit_size, subarchitecture_size, filename, reps=1, workers=None, jobs=None, persist='false'):
+
+    from mqt import qmap
+    from misc.random_qc import random_circuit
+    from misc.graph_to_arch import graph_to_architecture
+    from misc.mapping import coupling_of_covering_graph
 
-    architecture = arch.architecture[architecture_name]()
+    architecture = arch.build_architecture(architecture_name)
     circuit_size = int(circuit_size)
     subarchitecture_size = int(subarchitecture_size)
     reps = int(reps)
+    workers = None if workers is None else int(workers)
+    jobs = None if jobs is None else int(jobs)
+    persist = persist.strip().lower() == 'true'
 
     # Also map the original architecture
     qmap_architecture = graph_to_architecture(architecture)
@@ -285,21 +289,16 @@ def opt_random(architecture_name, circuit_size, subarchitecture_size, filename,
 
     # Helper functions for some stuff
     def comp_opt_subarch():
-        return alg.size_k_optimal_subgraphs_slow(architecture, subarchitecture_size)
+        return alg.size_k_optimal_subarchitectures_cached(architecture, subarchitecture_size, workers=workers)
 
     def comp_subarch_order():
-        return qmap.SubarchitectureOrder.from_qmap_architecture(qmap_architecture)
+        with instrumentation.timed("subarchitecture order"):
+            return qmap.SubarchitectureOrder.from_qmap_architecture(qmap_architecture)
 
     def comp_opt_cov(order, size):
         def fun():
-            return order.covering(circuit_size, size)
-        return fun
-
-    def comp_opt_mapping(qc, arch):
-        def fun():
-            comp = qmap.compile(qc, arch, method="exact", post_mapping_optimizations=False)
-            #return comp[1].json()["statistics"]
-            return comp[1]
+            with instrumentation.timed("covering"):
+                return order.covering(circuit_size, size)
         return fun
 
     print(f"Testing {reps} random circuits on {architecture_name} with {circuit_size} qubits in circuit and {subarchitecture_size} qubits on architecture")
@@ -329,17 +328,27 @@ def opt_random(architecture_name, circuit_size, subarchitecture_size, filename,
     # sub_mp, sub_mp_t, cov_1, cov_1_t, cov_2, cov_2_t, ...
     mapping = [[] for _ in circuits]
     mapping_t = [[] for _ in circuits]
+
+    # Map every circuit to our subarchitectures and to each covering, all at once
+    subcouplings = [subarch.to_coupling() for subarch in optsubarch]
+    covcouplings = [[coupling_of_covering_graph(subarch) for subarch in covering] for covering in coverings]
+    mapping_jobs = []
+    for idx in range(len(circuits)):
+        mapping_jobs += [(idx, coupling) for coupling in subcouplings]
+        for couplings in covcouplings:
+            mapping_jobs += [(idx, coupling) for coupling in couplings]
+
+    print(f"Starting {len(mapping_jobs)} mappings")
+
+    mapped = iter(run_mappings(circuits, mapping_jobs, jobs, persist))
+
     for idx, qc in enumerate(circuits):
 
-        print("Starting mapping to subarchitectures")
-        
-        # Map circuit to our subarchitectures first
+        # Collect mappings to our subarchitectures first
         sub = None
         sub_t = 0.0
         for subarch in optsubarch:
-            archt = graph_to_architecture(subarch)
-            mp, mp_t = time_it(comp_opt_mapping(qc, archt))
-            mp = mp.json()["statistics"]
+            mp, mp_t = next(mapped)
             sub_t += mp_t
             if sub is None or mp["additional_gates"] < sub:
                 sub = mp["additional_gates"]
@@ -349,18 +358,14 @@ def opt_random(architecture_name, circuit_size, subarchitecture_size, filename,
 
         print(f"Mapped to all subarchitectures with {sub} in {sub_t}s")
 
-        # Map circuit to each covering of each size
+        # Collect mappings to each covering of each size
         for size, covering in enumerate(coverings, start=1):
 
-            print(f"Starting mapping to size {size} covering")
-
-            # Map circuit to each subarchitecture in covering
+            # Collect mappings to each subarchitecture in covering
             cov = None
             cov_t = 0.0
             for subarch in covering:
-                archt = qmap.Architecture(len(subarch.nodes()), set(subarch.edge_list()))
-                mp, mp_t = time_it(comp_opt_mapping(qc, archt))
-                mp = mp.json()["statistics"]
+                mp, mp_t = next(mapped)
                 cov_t += mp_t
                 if cov is None or mp["additional_gates"] < cov:
                     cov = mp["additional_gates"]
@@ -408,33 +413,48 @@ def opt_random(architecture_name, circuit_size, subarchitecture_size, filename,
                 row_3 += [mapping[cidx][idx], mapping_t[cidx][idx]]
             writer.writerow(row_1 + row_2 + row_3)
 
+    write_report(filename, "randomcircuit", architecture=architecture_name, circuit_size=circuit_size, subarchitecture_size=subarchitecture_size, reps=reps)
+
 
 # Subarchitecture counting
-def count_subarch(architecture_name, circuit_size, filename, max_size=None, brute_force='true'):
+def count_subarch(architecture_name, circuit_size, filename, max_size=None, brute_force='true', workers=None, sweep='false', orbits='false', tree='false'):
 
-    architecture = arch.architecture[architecture_name]()
+    architecture = arch.build_architecture(architecture_name)
     circuit_size = int(circuit_size)
     brute_force = brute_force.strip().lower() == 'true'
+    workers = None if workers is None else int(workers)
+    sweep = sweep.strip().lower() == 'true'
+    orbits = orbits.strip().lower() == 'true'
+    tree = tree.strip().lower() == 'true'
 
     if max_size is None:
         max_size = circuit_size
     else:
         max_size = int(max_size)
 
+    # Compute all sizes in a single pass
+    if sweep:
+        swept = alg.size_k_sweep(architecture, circuit_size, max_size, workers=workers)
+
     # Count all non-isomorphic, optimal as well as brute force solution
     def totarch(sz):
         def fun():
-            return alg.count_size_k_induced_connected_subgraphs_tree(architecture, sz)
+            return alg.count_size_k_connected_per_root(architecture, sz, workers=workers)
+        return fun
+
+    def treearch(sz):
+        def fun():
+            return alg.count_size_k_induced_connected_subgraphs_tree(architecture, sz, workers=workers)
         return fun
 
     def nonisoarch(sz):
         def fun():
-            return alg.size_k_induced_connected_subgraphs_ram(architecture, sz)
+            return alg.size_k_induced_connected_subgraphs_ram(architecture, sz, workers=workers)
         return fun
 
     def optarch(sz):
         def fun():
-            return alg.size_k_optimal_subgraphs_slow(architecture, sz)
+            return alg.size_k_optimal_subgraphs_slow(architecture, sz, workers=workers)
         return fun
 
     def bftotarch(sz):
@@ -442,22 +462,44 @@ def count_subarch(architecture_name, circuit_size, filename, max_size=None, brut
             return alg.count_size_k_induced_connected_subgraphs_bf(architecture, sz)
         return fun
 
+    def orbitarch(sz):
+        def fun():
+            return alg.count_size_k_connected_orbits(architecture, sz, workers=workers)
+        return fun
+
 
     measurements = []
+    per_root = {}
 
     for cz in range(circuit_size, max_size+1):
         print(f"Counting subarchitectures on {architecture_name} with {cz} qubits")
 
-        # Count total number of sub-architectures
-        totsubarch, totsubarch_t = time_it(totarch(cz))
+        # Count total number of sub-architectures, per root qubit unless swept
+        if sweep:
+            totsubarch, totsubarch_t = swept[cz].count, swept[cz].enumerate_time
+        else:
+            per_root[cz], totsubarch_t = time_it(totarch(cz))
+            totsubarch = sum(per_root[cz].values())
 
         print(f"Total number of subarchitectures {totsubarch} in {totsubarch_t}s")
 
-        nonisosubarch, nonisosubarch_t = time_it(nonisoarch(cz))
+        # The heaviest root bounds how well the roots parallelise
+        if cz in per_root and totsubarch > 0:
+            heaviest = max(per_root[cz], key=per_root[cz].get)
+            mean = totsubarch / len(per_root[cz])
+            print(f"Heaviest root {heaviest} with {per_root[cz][heaviest]} subarchitectures, {per_root[cz][heaviest] / mean:.1f} times the mean")
+
+        if sweep:
+            nonisosubarch, nonisosubarch_t = swept[cz].non_isomorphic, swept[cz].enumerate_time
+        else:
+            nonisosubarch, nonisosubarch_t = time_it(nonisoarch(cz))
 
         print(f"Non-isomorphic subarchitectures {len(nonisosubarch)} in {nonisosubarch_t}s")
 
-        optsubarch, optsubarch_t = time_it(optarch(cz))
+        if sweep:
+            optsubarch, optsubarch_t = swept[cz].optimal, swept[cz].optimal_time
+        else:
+            optsubarch, optsubarch_t = time_it(optarch(cz))
 
         print(f"Optimal sub-architectures {len(optsubarch)} in {optsubarch_t}s")
 
@@ -473,6 +515,22 @@ def count_subarch(architecture_name, circuit_size, filename, max_size=None, brut
         # Save all measurements to list
         measurements.append([totsubarch, len(nonisosubarch), len(optsubarch), totsubarch_t, bftotsubarch_t, optsubarch_t])
 
+        # Count the orbits of the subarchitectures under the symmetries of the architecture
+        if orbits:
+            (_, orbitsubarch), orbitsubarch_t = time_it(orbitarch(cz))
+
+            print(f"Subarchitecture orbits {orbitsubarch} in {orbitsubarch_t}s")
+
+            measurements[-1] += [orbitsubarch, orbitsubarch_t]
+
+        # Time the enumeration of the tree engine for comparison, on request
+        if tree:
+            treesubarch, treesubarch_t = time_it(treearch(cz))
+
+            print(f"Tree enumeration of {treesubarch} subarchitectures in {treesubarch_t}s")
+
+            measurements[-1] += [treesubarch_t]
+
     # Save all the measured data to the specified csv file
     with open(filename, "a+", newline="") as csvfile:
         writer = csv.writer(csvfile, delimiter=" ")
@@ -482,10 +540,14 @@ def count_subarch(architecture_name, circuit_size, filename, max_size=None, brut
             "Total subarchitectures",
             "Non-isomorphic subarchitectures",
             "Optimal sub-architectures",
-            "Connected Subgraphs Tree-compute (s)",
+            "Connected Subgraphs Count-compute (s)",
             "Connected Subgraphs BruteForce-compute (s)",
             "Optimal Subarchitectures compute (s)"
         ]
+        if orbits:
+            header += ["Subarchitecture orbits", "Orbits compute (s)"]
+        if tree:
+            header += ["Connected Subgraphs Tree-compute (s)"]
         writer.writerow(header)
 
         # Write resutls
@@ -497,9 +559,12 @@ def count_subarch(architecture_name, circuit_size, filename, max_size=None, brut
             ] + measurements[cz - circuit_size])
         writer.writerows(results)
 
+    write_report(filename, "subarchcount", architecture=architecture_name, circuit_size=circuit_size, max_size=max_size, per_root=per_root)
+
 
 # Main function to launch experiments
 def main():
+    import os
     import sys
 
     if len(sys.argv) == 1:
@@ -510,6 +575,10 @@ def main():
     pg = sys.argv[1]
     args = sys.argv[2:]
 
+    # Every run reports its own counters and timers, with per-item timers on request
+    instrumentation.reset()
+    instrumentation.detailed = os.environ.get("SUBARCH_DETAILED_TIMERS", "") not in ("", "0")
+
     # Match based on program name
     if pg == "subarchcount":
         count_subarch(*args)
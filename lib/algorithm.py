@@ -1,23 +1,51 @@
 import networkx as nx
-from typing import Iterable
+from typing import Iterable, Callable, Hashable, Sequence, TYPE_CHECKING
+from dataclasses import dataclass, field
 from lib.archlogging import Logger, DummyLogger
-from lib.kcongraph.consubgraph import size_k_connected_subgraphs_tree
+from lib import instrumentation
+from lib.canonical import IsomorphismFilter, induced_adjacency
+from lib.kcongraph.compactgraph import CompactGraph
+from lib.kcongraph.consubgraph import iter_size_k_connected_masks_tree
+from lib.kcongraph.esu import iter_size_k_connected_masks_esu
+from lib.kcongraph.counting import count_size_k_connected_sets_per_root
+from lib.kcongraph.orbits import iter_size_k_connected_masks_orbits, orbit_size
+from lib.kcongraph.sweep import iter_connected_masks_upto
+from lib.kcongraph.spanning import iter_connected_spanning_edge_masks
+from lib.subarchitecture import Subarchitecture
+
+# The result store and the vertex set store (which needs NumPy) are imported
+# by the functions using them rather than by everything using this module
+if TYPE_CHECKING:
+    from lib.resultstore import ResultStore
+    from lib.kcongraph.vertexstore import VertexSetStore
 
 logger = DummyLogger()
 
-# Utility function for logging progress
-def enable_logger(architecture, qubits):
-    global logger
-    logger = Logger(architecture, qubits)
+# Bumped whenever a change may alter the subarchitectures computed here, or
+# the way a ResultStore saves them, which invalidates everything saved under
+# older versions
+ALGORITHM_VERSION: int = 3
 
+# Engines enumerating connected vertex sets as vertex masks of a CompactGraph
+# All accept a workers= keyword to spread the root vertices over processes.
+# orbits only yields one set per orbit under the automorphisms of the
+# architecture, which still covers every isomorphism class
+engines: dict[str, Callable[..., Iterable[int]]] = {
+    "tree": iter_size_k_connected_masks_tree,
+    "esu": iter_size_k_connected_masks_esu,
+    "orbits": iter_size_k_connected_masks_orbits,
+}
 
-# Utility functions for hashing graphs with specific number of iterations
-def hash_it(G: nx.Graph) -> int:
-    return 8
 
+# Checks that engine yields every connected set, for results that list them all
+def _require_every_set(engine: str) -> None:
+    if engine == "orbits":
+        raise ValueError("The orbits engine yields one set per orbit, use tree or esu to list every set")
 
-def hash_graph(G: nx.Graph) -> str:
-    return nx.weisfeiler_lehman_graph_hash(G, iterations=hash_it(G))
+# Utility function for logging progress
+def enable_logger(architecture, qubits, interval=1.0, every=None, jsonl=None):
+    global logger
+    logger = Logger(architecture, qubits, interval, every, jsonl)
 
 
 def size_k_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
@@ -29,23 +57,42 @@ def size_k_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
     return subgraphs
 
 
-def size_k_non_isomorphic_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
+def size_k_non_isomorphic_subgraphs(
+    G: nx.Graph, k: int, engine: str = "tree", workers: int | None = None
+) -> Iterable[nx.Graph]:
 
-    # Compute all subgraphs of size k
-    subgraphs = bf_connected_subgraphs(G, k)  # need to be all edges config
-    # subgraphs = size_k_connected_subgraphs_tree(G, k)
+    # Every connected subgraph spans a connected induced subgraph, and isomorphic
+    # induced subgraphs have the same spanning subgraphs up to isomorphism
+    induced = size_k_induced_connected_subgraphs_ram(G, k, engine, workers)
 
-    # Compute all non-isomorphic of those
-    non_isomorphic_subgraphs = non_isomorphic_graphs_hash(subgraphs)
+    # Stream the spanning subgraphs of each class into one filter
+    isomorphism_filter = IsomorphismFilter()
+    non_isomorphic_subgraphs: Iterable[nx.Graph] = []
+    for isg in induced:
+        cg = CompactGraph.from_networkx(isg)
+        for emask in iter_connected_spanning_edge_masks(cg):
+            if isomorphism_filter.add_adjacency(cg.n, edge_adjacency(cg, emask)):
+                non_isomorphic_subgraphs.append(cg.edge_subgraph_to_networkx(emask))
 
     return non_isomorphic_subgraphs
 
 
-def size_k_induced_non_isomorphic_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
+# Neighbour masks of the spanning subgraph of G with the edges in emask
+def edge_adjacency(G: CompactGraph, emask: int) -> list[int]:
+    adj = [0] * G.n
+    for u, v in G.edges_of(emask):
+        adj[u] |= 1 << v
+        adj[v] |= 1 << u
+    return adj
+
+
+def size_k_induced_non_isomorphic_subgraphs(
+    G: nx.Graph, k: int, engine: str = "tree", workers: int | None = None
+) -> Iterable[nx.Graph]:
 
     # Compute all induced subgraphs of size k
     # subgraphs = size_k_non_isomorphic_subgraphs(G, k)
-    subgraphs = size_k_induced_connected_subgraphs(G, k)
+    subgraphs = size_k_induced_connected_subgraphs(G, k, engine, workers)
 
     # Compute all non-isomorphic of those
     non_isomorphic_subgraphs = non_isomorphic_graphs_hash(subgraphs)
@@ -53,31 +100,100 @@ def size_k_induced_non_isomorphic_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.
     return non_isomorphic_subgraphs
 
 
-def size_k_induced_connected_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
+def size_k_connected_vertex_sets(
+    G: nx.Graph,
+    k: int,
+    engine: str = "tree",
+    workers: int | None = None,
+    budget_mb: float | None = None,
+) -> "VertexSetStore":
+    """
+    Stores every connected set of k vertices of G as a row of vertex indices
+    into the node order of G, spilling to disk beyond budget_mb.
+    """
+    from lib.kcongraph.vertexstore import VertexSetStore
 
     global logger
 
+    _require_every_set(engine)
     logger.pre_start_induced_connected_subgraphs()
 
-    # Compute all configurations of nodes
-    configs: Iterable[Iterable[int]] = size_k_connected_subgraphs_tree(G, k)
+    # Stream all configurations of nodes as vertex masks
+    cg = CompactGraph.from_networkx(G)
+    configs: Iterable[int] = engines[engine](cg, k, workers=workers)
 
-    logger.start_induced_connected_subgraphs(len(configs))
+    logger.start_induced_connected_subgraphs(None)
 
-    # Extract all subgraphs
-    subgraphs: Iterable[nx.Graph] = []
-    for idx, config in enumerate(configs):
-        logger.update_induced_connected_subgraphs(idx + 1)
-        g = nx.Graph(nx.induced_subgraph(G, config))
-        subgraphs.append(g)
+    store = VertexSetStore(k, budget_mb)
+    configs = instrumentation.timed_iter("enumeration", configs)
+    timer = instrumentation.stage("vertex set storage", "enumeration")
+    with instrumentation.timed_excluding(timer, "enumeration"):
+        store.extend_masks(logger.track(configs, logger.update_induced_connected_subgraphs))
+    instrumentation.count("connected sets", len(store))
+    return store
 
-    # Return found subgraphs
-    return subgraphs
 
+def size_k_induced_connected_subgraphs(
+    G: nx.Graph,
+    k: int,
+    engine: str = "tree",
+    workers: int | None = None,
+    budget_mb: float | None = None,
+) -> Sequence[nx.Graph]:
+
+    from lib.kcongraph.vertexstore import InducedSubgraphs
+
+    # Only the vertex sets are kept, each subgraph is built when it is read
+    store = size_k_connected_vertex_sets(G, k, engine, workers, budget_mb)
+    return InducedSubgraphs(CompactGraph.from_networkx(G), store)
 
-def count_size_k_induced_connected_subgraphs_tree(G: nx.Graph, k: int) -> int:
-    configs: Iterable[Iterable[int]] = size_k_connected_subgraphs_tree(G, k)
-    return len(configs)
+
+def count_size_k_induced_connected_subgraphs_tree(
+    G: nx.Graph, k: int, engine: str = "tree", workers: int | None = None
+) -> int:
+    cg = CompactGraph.from_networkx(G)
+    configs: Iterable[int] = engines[engine](cg, k, workers=workers)
+    with instrumentation.timed("enumeration"):
+
+        # orbits yields a single set of each orbit
+        if engine == "orbits":
+            total = sum(orbit_size(cg, config) for config in configs)
+        else:
+            total = sum(1 for _ in configs)
+    instrumentation.count("connected sets", total)
+    return total
+
+
+def count_size_k_connected_per_root(
+    G: nx.Graph, k: int, workers: int | None = None
+) -> dict[Hashable, int]:
+    """
+    Returns, for every vertex of G, the number of connected induced subgraphs
+    with k vertices whose lowest vertex in the node order of G is that one.
+    The sets are only counted, never stored, so memory stays polynomial.
+    """
+    cg = CompactGraph.from_networkx(G)
+    with instrumentation.timed("enumeration"):
+        counts = count_size_k_connected_sets_per_root(cg, k, workers)
+    instrumentation.count("connected sets", sum(counts))
+    return dict(zip(cg.labels, counts))
+
+
+def count_size_k_connected_orbits(
+    G: nx.Graph, k: int, workers: int | None = None
+) -> tuple[int, int]:
+    """
+    Returns the number of connected induced subgraphs with k vertices and the
+    number of orbits they form under the automorphisms of G. Only one set per
+    orbit is enumerated, the total follows from the size of each orbit.
+    """
+    cg = CompactGraph.from_networkx(G)
+    total = 0
+    orbits = 0
+    for config in iter_size_k_connected_masks_orbits(cg, k, workers=workers):
+        total += orbit_size(cg, config)
+        orbits += 1
+    return total, orbits
 
 
 def count_size_k_induced_connected_subgraphs_bf(G: nx.Graph, k: int) -> int:
@@ -89,91 +205,101 @@ def count_size_k_induced_connected_subgraphs_bf(G: nx.Graph, k: int) -> int:
     # Import useful tool
     from itertools import combinations
 
-    # Enumerate all subsets of k vertices
-    combs = list(combinations(G.nodes, k))
+    # Enumerate all subsets of k vertices as vertex masks, one at a time
+    from math import comb
+
+    cg = CompactGraph.from_networkx(G)
+    combs = combinations([1 << i for i in range(cg.n)], k)
 
     # Log progress
-    logger.start_induced_connected_subgraphs(len(combs))
+    logger.start_induced_connected_subgraphs(comb(cg.n, k))
 
     # Perform enumeration
-    for idx, combination in enumerate(combs):
-
-        # Log progress
-        logger.update_induced_connected_subgraphs(idx + 1)
-
-        # Generate subgraph
-        subgraph = nx.induced_subgraph(G, combination)
+    for combination in logger.track(combs, logger.update_induced_connected_subgraphs):
 
         # Check if subgraph is connected
-        if nx.is_connected(subgraph):
+        if cg.is_connected(sum(combination)):
             subgraph_count += 1
 
     # Return generated subgraphs
     return subgraph_count
 
 
-def size_k_induced_connected_subgraphs_ram(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
+def size_k_subarchitectures(
+    G: nx.Graph, k: int, engine: str = "tree", workers: int | None = None
+) -> list[Subarchitecture]:
+    """
+    Returns one induced, connected subarchitecture with k vertices per
+    isomorphism class, along with the number of connected sets in its class.
+    """
 
     global logger
     logger.pre_start_induced_connected_subgraphs()
 
-    # Compute all configurations of nodes
-    configs: Iterable[Iterable[int]] = size_k_connected_subgraphs_tree(G, k)
+    # Stream all configurations of nodes, so only one is held at a time
+    cg = CompactGraph.from_networkx(G)
+    configs: Iterable[int] = engines[engine](cg, k, workers=workers)
 
-    logger.start_induced_connected_subgraphs(len(configs))
+    logger.start_induced_connected_subgraphs(None)
 
-    # Extract all subgraphs with hashing to avoid isomorphisms
-    hashes: set[str] = set()
-    subgraphs: Iterable[nx.Graph] = []
-    for idx, config in enumerate(configs):
-        logger.update_induced_connected_subgraphs(idx + 1)
-        g = nx.Graph(nx.induced_subgraph(G, config))
-        g_h = hash_graph(g)
+    # Extract all subarchitectures with canonical forms to avoid isomorphisms
+    isomorphism_filter = IsomorphismFilter()
+    subarchitectures: list[Subarchitecture] = []
+    configs = instrumentation.timed_iter("enumeration", configs)
+    timer = instrumentation.stage("induced extraction", "enumeration")
+    with instrumentation.timed_excluding(timer, "enumeration", "canonical labelling"):
+        for config in logger.track(configs, logger.update_induced_connected_subgraphs):
 
-        if g_h not in hashes:
-            hashes.add(g_h)
-            subgraphs.append(g)
+            # orbits yields a single set of each orbit
+            weight = orbit_size(cg, config) if engine == "orbits" else 1
 
-    # Return found subgraphs
-    return subgraphs
+            cls, new = isomorphism_filter.classify_adjacency(*induced_adjacency(cg, config))
+            if new:
+                subarchitectures.append(Subarchitecture.induced(cg, config, weight))
+            else:
+                subarchitectures[cls].embeddings += weight
+    instrumentation.count("connected sets", isomorphism_filter.added)
+
+    return subarchitectures
 
 
+def size_k_induced_connected_subgraphs_ram(
+    G: nx.Graph, k: int, engine: str = "tree", workers: int | None = None
+) -> Iterable[nx.Graph]:
+    return [s.to_networkx() for s in size_k_subarchitectures(G, k, engine, workers)]
 
-def bf_induced_connected_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
+
+def bf_induced_connected_subgraphs(
+    G: nx.Graph, k: int, budget_mb: float | None = None
+) -> Sequence[nx.Graph]:
     """
     Computes all connected, induced subgraphs.
     """
-    global logger
+    from lib.kcongraph.vertexstore import InducedSubgraphs, VertexSetStore
 
-    # Resulting iterable
-    subgraphs: Iterable[nx.Graph] = []
+    global logger
 
     # Import useful tool
     from itertools import combinations
 
-    # Enumerate all subsets of k vertices
-    combs = list(combinations(G.nodes, k))
+    # Enumerate all subsets of k vertices as vertex masks
+    cg = CompactGraph.from_networkx(G)
+    combs = combinations([1 << i for i in range(cg.n)], k)
 
     # Log progress
-    logger.start_induced_connected_subgraphs(len(combs))
-
-    # Perform enumeration
-    for idx, combination in enumerate(combs):
-
-        # Log progress
-        logger.update_induced_connected_subgraphs(idx + 1)
+    from math import comb
 
-        # Generate subgraph
-        subgraph = nx.induced_subgraph(G, combination)
+    logger.start_induced_connected_subgraphs(comb(cg.n, k))
 
-        # Check if subgraph is connected
-        if nx.is_connected(subgraph):
-            g = nx.Graph(subgraph)
-            subgraphs.append(g)
-
-    # Return generated subgraphs
-    return subgraphs
+    # Perform enumeration, keeping only the vertex sets of connected subgraphs
+    store = VertexSetStore(k, budget_mb)
+    for combination in logger.track(combs, logger.update_induced_connected_subgraphs):
+        mask = sum(combination)
+        if cg.is_connected(mask):
+            store.append_mask(mask)
 
+    # Subgraphs are built when they are read
+    return InducedSubgraphs(cg, store)
 
 
 def bf_induced_connected_subgraphs_ram(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
@@ -184,32 +310,30 @@ def bf_induced_connected_subgraphs_ram(G: nx.Graph, k: int) -> Iterable[nx.Graph
 
     # Resulting iterable
     subgraphs: Iterable[nx.Graph] = []
-    hashes: set[str] = set()
+    isomorphism_filter = IsomorphismFilter()
 
     # Import useful tool
     from itertools import combinations
 
-    # Enumerate all subsets of k vertices
-    combs = list(combinations(G.nodes, k))
+    # Enumerate all subsets of k vertices as vertex masks, one at a time
+    from math import comb
+
+    cg = CompactGraph.from_networkx(G)
+    combs = combinations([1 << i for i in range(cg.n)], k)
 
     # Log progress
-    logger.start_induced_connected_subgraphs(len(combs))
+    logger.start_induced_connected_subgraphs(comb(cg.n, k))
 
     # Perform enumeration
-    for idx, combination in enumerate(combs):
-
-        # Log progress
-        logger.update_induced_connected_subgraphs(idx + 1)
+    for combination in logger.track(combs, logger.update_induced_connected_subgraphs):
 
-        # Generate subgraph
-        subgraph = nx.induced_subgraph(G, combination)
-        g_hash = hash_graph(subgraph)
+        # Check if subgraph is connected and new before building it
+        mask = sum(combination)
+        if not cg.is_connected(mask):
+            continue
 
-        # Check if subgraph is connected
-        if nx.is_connected(subgraph) and g_hash not in hashes:
-            g = nx.Graph(subgraph)
-            subgraphs.append(g)
-            hashes.add(g_hash)
+        if isomorphism_filter.add_adjacency(*induced_adjacency(cg, mask)):
+            subgraphs.append(cg.to_networkx(mask))
 
     # Return generated subgraphs
     return subgraphs
@@ -234,16 +358,10 @@ def bf_connected_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
 
     # Get all subgraphs from induced_subgraphs
     # for idx, isg in enumerate(non_isomorphic_subgraphs):
-    for idx, isg in enumerate(induced_subgraphs):
-
-        # Log progress
-        logger.update_connected_subgraphs(idx + 1)
+    for isg in logger.track(induced_subgraphs, logger.update_connected_subgraphs):
 
         # Generate all connected subgraphs
-        connected_subgraphs = connected_edge_reduction(isg)
-
-        # Append list
-        subgraphs += connected_subgraphs
+        subgraphs.extend(iter_connected_edge_reduction(isg))
 
     # Return computed subgraphs
     return subgraphs
@@ -251,40 +369,19 @@ def bf_connected_subgraphs(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
 
 def connected_edge_reduction(G: nx.Graph) -> Iterable[nx.Graph]:
     """
-    Performs a state-search over all subgraphs consisting of the same vertices
-    but with less edges while still being connected.
+    Computes all subgraphs consisting of the same vertices but with less edges
+    while still being connected, together with G itself. Each one is found
+    exactly once.
     """
+    return list(iter_connected_edge_reduction(G))
 
-    # Import datastructure used for BFS
-    from collections import deque
-
-    # Create queue
-    queue = deque()
-    queue.append(G)
-
-    # Create results list
-    subgraphs: Iterable[nx.Graph] = [G]
-
-    # Consume queue
-    while len(queue) > 0:
 
-        # Pop graph
-        g: nx.Graph = queue.popleft()
+def iter_connected_edge_reduction(G: nx.Graph) -> Iterable[nx.Graph]:
 
-        # Enumerate all edge removals
-        for edge in g.edges:
-
-            # Try to remove edge
-            gp = nx.Graph(g)
-            gp.remove_edge(*edge)
-
-            # See if still connected
-            if nx.is_connected(gp):
-                subgraphs.append(gp)
-                queue.append(gp)
-
-    # Return found connected subgraphs
-    return subgraphs
+    # Represent subgraphs as masks over the edges of G
+    cg = CompactGraph.from_networkx(G)
+    for emask in iter_connected_spanning_edge_masks(cg):
+        yield cg.edge_subgraph_to_networkx(emask)
 
 
 def non_isomorphic_graphs_hash(graphs: Iterable[nx.Graph]) -> Iterable[nx.Graph]:
@@ -294,24 +391,28 @@ def non_isomorphic_graphs_hash(graphs: Iterable[nx.Graph]) -> Iterable[nx.Graph]
     # Non-isomorphic subgraphs
     non_isomorphic: Iterable[nx.Graph] = []
 
-    # Keep set of all hashes for isomorphism
-    hashes: set[str] = set()
+    # Keep one graph per isomorphism class
+    isomorphism_filter = IsomorphismFilter()
 
     # Check each graph manually
     for g in graphs:
 
-        # Compute hash and check if already saved
-        ghash = hash_graph(g)
-
         # If not existing graph, save it
-        if ghash not in hashes:
-            hashes.add(ghash)
+        if isomorphism_filter.add(g):
             non_isomorphic.append(g)
 
     return non_isomorphic
 
 
-def size_k_optimal_subgraphs_slow(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
+def size_k_optimal_subgraphs_slow(
+    G: nx.Graph, k: int, engine: str = "tree", workers: int | None = None
+) -> Iterable[nx.Graph]:
+    return {s.to_networkx() for s in size_k_optimal_subarchitectures(G, k, engine, workers)}
+
+
+def size_k_optimal_subarchitectures(
+    G: nx.Graph, k: int, engine: str = "tree", workers: int | None = None
+) -> list[Subarchitecture]:
     global logger
 
     # Generate al non-isomorphic, induced connected subgraphs of size k
@@ -320,21 +421,178 @@ def size_k_optimal_subgraphs_slow(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
     #candidates = non_isomorphic_graphs_hash(subgraphs)
 
     # Use RAM-friendly implementation
-    candidates = size_k_induced_connected_subgraphs_ram(G, k)
+    candidates = size_k_subarchitectures(G, k, engine, workers)
+
+    # Keep those not contained in any other candidate, without caching their graphs
+    graphs = [s.build_networkx() for s in candidates]
+    maximal = {id(g) for g in maximal_subgraphs(graphs, workers=workers)}
+    return [s for s, g in zip(candidates, graphs) if id(g) in maximal]
+
+
+# Profile of necessary conditions for monomorphisms between graphs of the same order
+def monomorphism_profile(g: nx.Graph) -> tuple[int, tuple[int, ...], int]:
+    degrees = tuple(sorted((d for _, d in g.degree), reverse=True))
+    triangles = sum(nx.triangles(g).values()) // 3
+    return (g.number_of_edges(), degrees, triangles)
+
+
+# Whether a graph with profile p may be monomorphic into one with profile q
+def may_embed(p: tuple[int, tuple[int, ...], int], q: tuple[int, tuple[int, ...], int]) -> bool:
+    return (
+        p[0] < q[0]
+        and p[2] <= q[2]
+        and len(p[1]) <= len(q[1])
+        and all(dp <= dq for dp, dq in zip(p[1], q[1]))
+    )
+
+
+def maximal_subgraphs(
+    candidates: Iterable[nx.Graph],
+    stats: dict[str, int] | None = None,
+    workers: int | None = None,
+) -> Iterable[nx.Graph]:
+    """
+    Returns the candidates that are not monomorphic into any other candidate.
+    Candidates must be pairwise non-isomorphic and have the same number of
+    vertices, so a candidate can only embed into one with strictly more edges.
+
+    Candidates are swept densest first, one edge count at a time, and each one
+    is only compared against the strictly denser candidates that survived so
+    far: anything embedding into a dominated candidate also embeds into its
+    dominator. Degree sequence dominance and triangle counts reject most pairs
+    before any VF2 call. Optionally counts VF2 calls made and avoided in stats.
+
+    With workers > 1 the candidates of each edge count are checked in a pool
+    of worker processes, which receive the candidate list once.
+    """
+    from time import perf_counter
+
+    global logger
+    start = perf_counter()
 
     # Optimal graphs
     C: Iterable[nx.Graph] = set()
 
+    # Group by decreasing edge count
+    candidates = list(candidates)
+    profiles = [monomorphism_profile(g) for g in candidates]
+    order = sorted(range(len(candidates)), key=lambda i: profiles[i][0], reverse=True)
+    levels: list[list[int]] = []
+    for i in order:
+        if levels and profiles[levels[-1][0]][0] == profiles[i][0]:
+            levels[-1].append(i)
+        else:
+            levels.append([i])
+
     # Start logging
     logger.start_optimal_subgraphs(len(candidates))
 
+    pool = None
+    if workers is not None and workers > 1 and len(levels) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_maximality_worker,
+            initargs=(candidates, profiles),
+        )
+
+    vf2_calls = 0
+    vf2_avoided = 0
+    done = 0
+    survivors: list[int] = []
+    try:
+        for level in levels:
+
+            # Only denser survivors may dominate, and they are all known by now
+            dominators = tuple(survivors)
+            if pool is None or not dominators:
+                verdicts = (_dominated(candidates, profiles, i, dominators) for i in level)
+            else:
+                chunksize = max(1, len(level) // (4 * workers))
+                verdicts = pool.map(
+                    _dominated_in_worker, level, [dominators] * len(level), chunksize=chunksize
+                )
+
+            for i, (dominated, calls, avoided) in zip(level, verdicts):
+
+                # Report progress
+                done += 1
+                if logger.enabled:
+                    logger.update_optimal_subgraphs(done)
+
+                vf2_calls += calls
+                vf2_avoided += avoided
+                if not dominated:
+                    survivors.append(i)
+                    C.add(candidates[i])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if stats is not None:
+        stats["vf2_calls"] = stats.get("vf2_calls", 0) + vf2_calls
+        stats["vf2_avoided"] = stats.get("vf2_avoided", 0) + vf2_avoided
+    instrumentation.count("vf2 calls", vf2_calls)
+    instrumentation.count("vf2 avoided", vf2_avoided)
+    instrumentation.add_time("maximality", perf_counter() - start)
+
+    # Return optimal subgraphs
+    return C
+
+
+def _dominated(
+    candidates: list[nx.Graph], profiles: list, i: int, dominators: Iterable[int]
+) -> tuple[bool, int, int]:
+    """
+    Checks whether candidate i is monomorphic into any of the dominators,
+    stopping at the first one found. Also returns the VF2 calls made and avoided.
+    """
+    vf2_calls = 0
+    vf2_avoided = 0
+    for j in dominators:
+
+        if not may_embed(profiles[i], profiles[j]):
+            vf2_avoided += 1
+            continue
+
+        # Check for subgraph isomorphism
+        vf2_calls += 1
+        gm = nx.algorithms.isomorphism.GraphMatcher(candidates[j], candidates[i])
+        if gm.subgraph_is_monomorphic():
+            return True, vf2_calls, vf2_avoided
+
+    return False, vf2_calls, vf2_avoided
+
+
+# Candidates of the current worker process, shipped once by the pool initializer
+_worker_candidates: list[nx.Graph] = []
+_worker_profiles: list = []
+
+
+def _init_maximality_worker(candidates: list[nx.Graph], profiles: list) -> None:
+    global _worker_candidates, _worker_profiles
+    _worker_candidates = candidates
+    _worker_profiles = profiles
+
+
+def _dominated_in_worker(i: int, dominators: tuple[int, ...]) -> tuple[bool, int, int]:
+    return _dominated(_worker_candidates, _worker_profiles, i, dominators)
+
+
+def maximal_subgraphs_pairwise(candidates: Iterable[nx.Graph]) -> Iterable[nx.Graph]:
+    """
+    Reference version of maximal_subgraphs comparing every pair of candidates.
+    """
+
+    # Optimal graphs
+    C: Iterable[nx.Graph] = set()
+
     # Check every candidate for subgraph isomorphism
+    candidates = list(candidates)
     candidates_all = candidates[:]
     for idx, cand in enumerate(candidates_all):
 
-        # Report progress
-        logger.update_optimal_subgraphs(idx + 1)
-
         # Compare to candidates in candidates
         subgraph_isomorphic = False
         for candp in candidates:
@@ -357,3 +615,139 @@ def size_k_optimal_subgraphs_slow(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
 
     # Return optimal subgraphs
     return C
+
+
+def size_k_optimal_subgraphs_cached(
+    G: nx.Graph,
+    k: int,
+    engine: str = "tree",
+    workers: int | None = None,
+    store: "ResultStore | None" = None,
+) -> Iterable[nx.Graph]:
+    """
+    Same as size_k_optimal_subgraphs_slow, but loads the result from store
+    (default ResultStore()) when it has been computed before, and saves it otherwise.
+    """
+
+    if store is None:
+        from lib.resultstore import ResultStore
+
+        store = ResultStore()
+
+    cached = store.get(G, k, ALGORITHM_VERSION)
+    if cached is not None:
+        return set(cached)
+
+    C = size_k_optimal_subgraphs_slow(G, k, engine, workers)
+    store.put(G, k, ALGORITHM_VERSION, C)
+    return C
+
+
+def size_k_optimal_subarchitectures_cached(
+    G: nx.Graph,
+    k: int,
+    engine: str = "tree",
+    workers: int | None = None,
+    store: "ResultStore | None" = None,
+) -> list[Subarchitecture]:
+    """
+    Same as size_k_optimal_subarchitectures, but cached like
+    size_k_optimal_subgraphs_cached. Embedding counts are kept next to the
+    subgraphs. For results saved without them, they are counted again and
+    saved along.
+    """
+    import json
+    from lib.resultstore import ResultStore, graph_digest
+
+    if store is None:
+        store = ResultStore()
+
+    cg = CompactGraph.from_networkx(G)
+    key = f"embeddings:{graph_digest(G)}:{k}:{ALGORITHM_VERSION}"
+    cached = store.get(G, k, ALGORITHM_VERSION)
+    if cached is not None:
+        C = [Subarchitecture.from_networkx(cg, g) for g in cached]
+        embeddings = store.get_value(key)
+        if embeddings is not None:
+            for s, e in zip(C, json.loads(embeddings)):
+                s.embeddings = e
+            return C
+
+        # Saved without embedding counts, so count them and save them along
+        counted = {s.canonical_key(): s.embeddings for s in size_k_subarchitectures(G, k, engine, workers)}
+        for s in C:
+            s.embeddings = counted[s.canonical_key()]
+        store.put_value(key, json.dumps([s.embeddings for s in C]))
+        return C
+
+    C = size_k_optimal_subarchitectures(G, k, engine, workers)
+    store.put(G, k, ALGORITHM_VERSION, [s.build_networkx() for s in C])
+    store.put_value(key, json.dumps([s.embeddings for s in C]))
+    return C
+
+
+# Results of a sweep for a single subarchitecture size
+@dataclass
+class SweepResult:
+    count: int = 0
+    non_isomorphic: list[nx.Graph] = field(default_factory=list)
+    optimal: Iterable[nx.Graph] = field(default_factory=set)
+    enumerate_time: float = 0.0
+    optimal_time: float = 0.0
+
+
+def size_k_sweep(
+    G: nx.Graph,
+    k_min: int,
+    k_max: int,
+    optimal: bool = True,
+    workers: int | None = None,
+) -> dict[int, SweepResult]:
+    """
+    Computes the number of connected induced subgraphs, the non-isomorphic ones
+    and (optionally) the optimal ones for every size from k_min to k_max in one
+    pass. Every connected vertex set of size k is grown from its canonical
+    parent of size k-1, so the whole range costs about as much as k_max alone.
+
+    enumerate_time is the time spent growing and classifying the sets of each
+    size, optimal_time the time of the maximality filter of each size.
+    """
+    from time import perf_counter
+
+    global logger
+
+    cg = CompactGraph.from_networkx(G)
+    results = {k: SweepResult() for k in range(k_min, k_max + 1)}
+    filters = {k: IsomorphismFilter() for k in results}
+
+    logger.start_induced_connected_subgraphs(None)
+
+    # Sizes below k_min are only grown through
+    idx = 0
+    last = perf_counter()
+    for mask in iter_connected_masks_upto(cg, k_max):
+        k = mask.bit_count()
+        if k < k_min:
+            continue
+
+        idx += 1
+        if logger.enabled:
+            logger.update_induced_connected_subgraphs(idx)
+
+        result = results[k]
+        result.count += 1
+        if filters[k].add_adjacency(*induced_adjacency(cg, mask)):
+            result.non_isomorphic.append(cg.to_networkx(mask))
+
+        now = perf_counter()
+        result.enumerate_time += now - last
+        last = now
+
+    # Filter out the optimal subarchitectures of each size
+    if optimal:
+        for result in results.values():
+            start = perf_counter()
+            result.optimal = maximal_subgraphs(result.non_isomorphic, workers=workers)
+            result.optimal_time = perf_counter() - start
+
+    return results
@@ -608,8 +608,108 @@ def eagle() -> nx.Graph:
     )
     return G
 
+# Parametric architectures for scaling studies. Each parameter has a default,
+# so they can be called like the fixed architectures above.
+
+
+# m x n grid, numbered row by row like grid_3x3 and grid_4x4
+def grid(m: int = 3, n: int | None = None) -> nx.Graph:
+    if n is None:
+        n = m
+    G = nx.Graph()
+    G.add_nodes_from(range(m * n))
+    for r in range(m):
+        G.add_edges_from((n * r + i, n * r + i + 1) for i in range(n - 1))
+    for r in range(m - 1):
+        G.add_edges_from((n * r + i, n * r + i + n) for i in range(n))
+    return G
+
+
+# Heavy-hex lattice of d rows of w heavy hexagons (w = d by default), the
+# layout of the IBM Falcon and Eagle chips. Rows of qubits are joined by
+# bridge qubits every four qubits, alternately offset by two, and the loose
+# ends left at the corners are dropped so every qubit lies on a hexagon
+def heavy_hex(d: int = 3, w: int | None = None) -> nx.Graph:
+    if w is None:
+        w = d
+    if d < 1 or w < 1:
+        raise ValueError(f"Heavy-hex needs at least one row and column of hexagons, got {d}x{w}")
+
+    length = 4 * w + 3
+    G = nx.Graph()
+    for r in range(d + 1):
+        G.add_edges_from(((r, p), (r, p + 1)) for p in range(length - 1))
+    for r in range(d):
+        for p in range(2 * (r % 2), length, 4):
+            G.add_edges_from([((r, p), ("bridge", r, p)), (("bridge", r, p), (r + 1, p))])
+
+    G = nx.k_core(G, 2)
+    order = sorted(G, key=lambda v: (v[1], v[2], 1) if v[0] == "bridge" else (v[0], v[1], 0))
+    return nx.relabel_nodes(G, {v: i for i, v in enumerate(order)})
+
+
+# Sycamore-style lattice of rows of cols qubits, each coupled diagonally to
+# two qubits of the next row. sycamore_lattice(9, 6) is google_sycamore
+def sycamore_lattice(rows: int = 4, cols: int = 4) -> nx.Graph:
+    G = nx.Graph()
+    G.add_nodes_from(range(rows * cols))
+    for r in range(rows - 1):
+        shift = -1 if r % 2 == 0 else 1
+        for i in range(cols):
+            G.add_edge(cols * r + i, cols * (r + 1) + i)
+            if 0 <= i + shift < cols:
+                G.add_edge(cols * r + i, cols * (r + 1) + i + shift)
+    return G
+
+
+# Rigetti tiling of width x height octagons, numbered row by row. Octagons
+# next to each other share two couplings. rigetti_octagons(5, 2) is rigetti_80
+def rigetti_octagons(width: int = 2, height: int = 1) -> nx.Graph:
+    G = nx.Graph()
+    G.add_nodes_from(range(8 * width * height))
+    for o in range(width * height):
+        G.add_edges_from((8 * o + i, 8 * o + (i + 1) % 8) for i in range(8))
+        if o % width != width - 1:
+            right = 8 * (o + 1)
+            G.add_edges_from([(8 * o, right + 5), (8 * o + 1, right + 4)])
+        if o + width < width * height:
+            below = 8 * (o + width)
+            G.add_edges_from([(8 * o + 2, below + 7), (8 * o + 3, below + 6)])
+    return G
+
+
+# Connected random coupling graph on n qubits with the given number of edges
+# and no qubit coupled to more than max_degree others. The same seed always
+# gives the same graph
+def random_sparse(n: int = 16, edges: int | None = None, max_degree: int = 3, seed: int = 0) -> nx.Graph:
+    import random
+
+    if edges is None:
+        edges = n + n // 4
+    if not n - 1 <= edges <= n * max_degree // 2:
+        raise ValueError(f"Cannot connect {n} qubits of degree at most {max_degree} with {edges} edges")
+
+    rng = random.Random(seed)
+    G = nx.Graph()
+    G.add_nodes_from(range(n))
+
+    # Random spanning tree, attaching every qubit to an earlier one with room left
+    for v in range(1, n):
+        G.add_edge(v, rng.choice([u for u in range(v) if G.degree(u) < max_degree]))
+
+    # Random extra couplings between qubits with room left
+    free = [v for v in G if G.degree(v) < max_degree]
+    while G.number_of_edges() < edges:
+        candidates = [(u, v) for i, u in enumerate(free) for v in free[i + 1 :] if not G.has_edge(u, v)]
+        if not candidates:
+            raise ValueError(f"Cannot place {edges} edges on {n} qubits of degree at most {max_degree}")
+        G.add_edge(*rng.choice(candidates))
+        free = [v for v in free if G.degree(v) < max_degree]
+    return G
+
+
 # Map from architecture name to generators
-architecture: dict[str, Callable[None, nx.Graph]] = {
+architecture: dict[str, Callable[..., nx.Graph]] = {
     "ibmq_quadalupe": ibmq_quadalupe,
     "double_o_plus": double_o_plus,
     "ibmq_tokyo": ibmq_tokyo,
@@ -624,4 +724,96 @@ architecture: dict[str, Callable[None, nx.Graph]] = {
     "rigetti_80": rigetti_80,
     "google_sycamore": sycamore,
     "ibmq_eagle": eagle,
+    "grid": grid,
+    "heavyhex": heavy_hex,
+    "sycamore": sycamore_lattice,
+    "octagons": rigetti_octagons,
+    "random": random_sparse,
 }
+
+
+def parse_architecture(spec: str) -> tuple[str, dict[str, int]]:
+    """
+    Splits an architecture given as name:param=value,... (e.g. heavyhex:d=5
+    or grid:m=3,n=4) into its name and integer parameters.
+    """
+    name, _, params = spec.partition(":")
+    if name not in architecture:
+        raise ValueError(f"Unknown architecture {name}")
+
+    kwargs = {}
+    for param in filter(None, params.split(",")):
+        key, sep, value = param.partition("=")
+        if not sep:
+            raise ValueError(f"Expected param=value in architecture {spec}, got {param}")
+        try:
+            kwargs[key.strip()] = int(value)
+        except ValueError:
+            raise ValueError(f"Architecture parameter {key} must be an integer, got {value}") from None
+    return name, kwargs
+
+
+# Builds the architecture given by name and optional parameters
+def build_architecture(spec: str) -> nx.Graph:
+    name, kwargs = parse_architecture(spec)
+    try:
+        return architecture[name](**kwargs)
+    except TypeError as e:
+        raise ValueError(f"Bad parameters for architecture {spec}: {e}") from None
+
+
+def test_parametric():
+    failed = False
+
+    # The generators reproduce the fixed architectures they generalise
+    for spec, fixed in [
+        ("grid:m=3", grid_3x3),
+        ("grid:m=4,n=4", grid_4x4),
+        ("sycamore:rows=9,cols=6", sycamore),
+        ("octagons:width=5,height=2", rigetti_80),
+    ]:
+        G, H = build_architecture(spec), fixed()
+        if set(G.nodes) != set(H.nodes) or {frozenset(e) for e in G.edges} != {frozenset(e) for e in H.edges}:
+            print("NOT THE FIXED ARCHITECTURE", spec)
+            failed = True
+
+    # Heavy hexagons are 12-cycles, and only those
+    for d, w in [(1, 1), (2, 3), (5, 5)]:
+        G = heavy_hex(d, w)
+        cycles = nx.minimum_cycle_basis(G)
+        if (
+            len(cycles) != d * w
+            or any(len(c) != 12 for c in cycles)
+            or not nx.is_connected(G)
+            or max(deg for _, deg in G.degree) > 3
+            or sorted(G) != list(range(G.number_of_nodes()))
+        ):
+            print("WRONG HEAVY HEX", d, w, G)
+            failed = True
+
+    G = build_architecture("random:n=30,edges=36,seed=7")
+    if (
+        not nx.is_connected(G)
+        or G.number_of_edges() != 36
+        or max(deg for _, deg in G.degree) > 3
+        or set(G.edges) != set(random_sparse(30, 36, seed=7).edges)
+    ):
+        print("WRONG RANDOM GRAPH", G)
+        failed = True
+
+    for spec in ["heavyhex:d=0", "grid:m=3,k=2", "grid:m=x", "nosuch"]:
+        try:
+            build_architecture(spec)
+            print("ACCEPTED", spec)
+            failed = True
+        except ValueError:
+            pass
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_parametric()
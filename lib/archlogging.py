@@ -1,85 +1,132 @@
+import sys
+from typing import Iterable, Iterator, TypeVar
+
+from lib.progress import Progress
+
+Item = TypeVar("Item")
+
+
 class Logger:
-    def __init__(self, architecture, qubits):
+    """
+    Reports the progress of each stage through a throttled Progress, so
+    updates may be given for every item. Output goes to stderr, or to a file
+    of JSON lines when jsonl is a path.
+    """
+
+    enabled = True
+
+    def __init__(self, architecture, qubits, interval=1.0, every=None, jsonl=None):
         self.arch = architecture
         self.qubits = qubits
-        print()
+        self.interval = interval
+        self.every = every
+        self.jsonl = None if jsonl is None else open(jsonl, "a")
+        self.stream = sys.stderr if self.jsonl is None else None
+        self.progress = None
+
+        # Final item count of each finished stage
+        self.counts = {}
 
     def __arch_str(self) -> str:
         return f"{self.arch}-{self.qubits}qubits"
 
+    def __message(self, *message):
+        if self.jsonl is not None:
+            import json
+
+            record = {"label": self.__arch_str(), "message": " ".join(map(str, message))}
+            self.jsonl.write(json.dumps(record) + "\n")
+            self.jsonl.flush()
+        else:
+            print(self.__arch_str(), *message, file=self.stream, flush=True)
+
+    def __close(self):
+        if self.progress is not None:
+            self.progress.finish()
+            self.counts[self.progress.stage] = self.progress.current
+            self.progress = None
+
+    def __start(self, stage, total):
+        self.__close()
+        self.progress = Progress(
+            self.__arch_str(),
+            stage,
+            total=total,
+            interval=self.interval,
+            every=self.every,
+            stream=self.stream,
+            jsonl=self.jsonl,
+        )
+
+    def track(self, items: Iterable[Item], update) -> Iterator[Item]:
+        """
+        Yields the items while passing their running count to update, one of
+        the update methods of this logger.
+        """
+        for idx, item in enumerate(items, 1):
+            update(idx)
+            yield item
+
     def pre_start_induced_connected_subgraphs(self):
-        print()
-        print(self.__arch_str(), "precomputing induced connected subgraphs")
+        self.__message("precomputing induced connected subgraphs")
 
     def start_induced_connected_subgraphs(self, combinations_num):
-        self.combinations_num = combinations_num
-        print(self.__arch_str(), "computing", combinations_num, "subgraphs")
+        # A combinations_num of None means the subgraphs are streamed
+        self.__start("induced subgraphs", combinations_num)
+        if combinations_num is None:
+            self.__message("streaming subgraphs")
+        else:
+            self.__message("computing", combinations_num, "subgraphs")
 
     def update_induced_connected_subgraphs(self, current_num):
-        self.current_num = current_num
-        print(
-            self.__arch_str(),
-            "computing induced subgraph",
-            current_num,
-            "of",
-            self.combinations_num,
-        )
+        self.progress.update(current_num)
 
     def start_isomorphism_elimination(self, graphs_num):
-        self.graphs_num = graphs_num
-        print(self.__arch_str(), "eliminating isomorphism from", graphs_num, "graphs")
+        self.__message("eliminating isomorphism from", graphs_num, "graphs")
 
     def start_connected_subgraphs(self, subgraph_num):
-        self.subgraph_num = subgraph_num
-        print()
-        print(
-            self.__arch_str(),
-            "computing all connected subgraphs of",
-            subgraph_num,
-            "subgraphs",
-        )
+        self.__start("edge reduction", subgraph_num)
+        self.__message("computing all connected subgraphs of", subgraph_num, "subgraphs")
 
     def update_connected_subgraphs(self, current_num):
-        self.current_num = current_num
-        print(
-            self.__arch_str(),
-            "computing edge reduction of subgraph",
-            current_num,
-            "out of",
-            self.subgraph_num,
-        )
+        self.progress.update(current_num)
 
     def start_optimal_subgraphs(self, cand_num):
-        self.cand_num = cand_num
-        print()
-        print(
-            self.__arch_str(), "computing optimal subgraphs of", cand_num, "candidates"
-        )
+        self.__start("subgraphism checks", cand_num)
+        self.__message("computing optimal subgraphs of", cand_num, "candidates")
 
     def update_optimal_subgraphs(self, current_num):
-        self.current_num = current_num
-        print(
-            self.__arch_str(),
-            "checking subgraphism of candidate",
-            current_num,
-            "of",
-            self.cand_num,
-        )
+        self.progress.update(current_num)
 
     def finish(self, optimal_count):
-        self.optimal_count = optimal_count
-        print()
-        print(self.__arch_str(), "Finished.")
-        print("Computed", optimal_count, "subgraphs out of")
-        print(self.cand_num, "candidates")
-        print(self.subgraph_num, "connected subgraphs")
-        print(self.combinations_num, "induced subgraphs")
+        self.__close()
+        self.__message(
+            "Finished. Computed",
+            optimal_count,
+            "subgraphs out of",
+            self.counts.get("subgraphism checks"),
+            "candidates,",
+            self.counts.get("edge reduction"),
+            "connected subgraphs and",
+            self.counts.get("induced subgraphs"),
+            "induced subgraphs",
+        )
 
 
 class DummyLogger:
+    """
+    Logger doing nothing. Hot loops check enabled and skip their per-item
+    updates altogether, and track hands back the items untouched.
+    """
+
+    enabled = False
+
     def __init__(self, architecture=None, qubits=None):
         pass
 
+    def track(self, items, update):
+        return items
+
     def pre_start_induced_connected_subgraphs(self):
         pass
 
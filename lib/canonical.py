@@ -0,0 +1,332 @@
+import networkx as nx
+from typing import Hashable
+from lib.kcongraph.compactgraph import CompactGraph
+from lib import instrumentation
+
+# Backend used for canonical keys, one of the keys of backends below.
+# Picked by set_backend on first use, so importing this module does not probe
+# for pynauty.
+backend: str | None = None
+
+
+# Converts a graph into its number of vertices and per-vertex neighbour masks
+def graph_adjacency(G: nx.Graph) -> tuple[int, list[int]]:
+    index = {v: i for i, v in enumerate(G.nodes)}
+    adj = [0] * len(index)
+    for u, v in G.edges:
+        adj[index[u]] |= 1 << index[v]
+        adj[index[v]] |= 1 << index[u]
+    return len(index), adj
+
+
+# Neighbour masks of the subgraph of G induced by the vertices in mask
+def induced_adjacency(G: CompactGraph, mask: int) -> tuple[int, list[int]]:
+    vertices = list(G.indices_of(mask))
+    adj = []
+    for v in vertices:
+        local = 0
+        nbrs = G.masks[v] & mask
+        for i, u in enumerate(vertices):
+            if (nbrs >> u) & 1:
+                local |= 1 << i
+        adj.append(local)
+    return len(vertices), adj
+
+
+# Cheap isomorphism invariant: vertex count, edge count and degree sequence
+def invariant(n: int, adj: list[int]) -> Hashable:
+    degrees = sorted(a.bit_count() for a in adj)
+    return (n, sum(degrees) // 2, tuple(degrees))
+
+
+def _refine(adj: list[int], cells: list[list[int]]) -> list[list[int]]:
+    """
+    Refines an ordered partition until it is equitable, i.e. every vertex of a
+    cell has the same number of neighbours in each cell. Cells are split by
+    neighbour count with the fragments ordered by that count, so the result does
+    not depend on how vertices are labelled.
+    """
+    changed = True
+    while changed:
+        changed = False
+        for splitter in range(len(cells)):
+            wmask = 0
+            for w in cells[splitter]:
+                wmask |= 1 << w
+
+            refined: list[list[int]] = []
+            for cell in cells:
+                if len(cell) == 1:
+                    refined.append(cell)
+                    continue
+                groups: dict[int, list[int]] = {}
+                for v in cell:
+                    groups.setdefault((adj[v] & wmask).bit_count(), []).append(v)
+                if len(groups) > 1:
+                    changed = True
+                refined.extend(groups[c] for c in sorted(groups))
+
+            cells = refined
+            if changed:
+                break
+    return cells
+
+
+def canonical_code(n: int, adj: list[int]) -> int:
+    """
+    Computes the largest upper-triangle adjacency bitstring over all labellings
+    reached by individualisation-refinement, which is the same for exactly the
+    graphs isomorphic to the given one. Subtrees that are images of already
+    explored ones under a known automorphism are skipped.
+    """
+    if n <= 1:
+        return 0
+
+    best: list[int | None] = [None]
+    best_lab: list[list[int]] = [[]]
+    automorphisms: list[tuple[int, ...]] = []
+
+    def code_of(lab: list[int]) -> int:
+        code = 0
+        for i in range(n):
+            row = adj[lab[i]]
+            for j in range(i + 1, n):
+                code = (code << 1) | ((row >> lab[j]) & 1)
+        return code
+
+    def search(cells: list[list[int]], path: list[int]) -> None:
+        cells = _refine(adj, cells)
+
+        # Discrete partitions are leaves, compare their labelling
+        if len(cells) == n:
+            lab = [c[0] for c in cells]
+            code = code_of(lab)
+            if best[0] is None or code > best[0]:
+                best[0] = code
+                best_lab[0] = lab
+            elif code == best[0]:
+                g = [0] * n
+                for a, b in zip(best_lab[0], lab):
+                    g[a] = b
+                automorphisms.append(tuple(g))
+            return
+
+        # Individualise each vertex of the first smallest non-trivial cell
+        targets = [i for i in range(len(cells)) if len(cells[i]) > 1]
+        t = min(targets, key=lambda i: len(cells[i]))
+        explored: list[int] = []
+        for v in cells[t]:
+
+            # Automorphisms fixing the path map explored subtrees onto others
+            if explored:
+                fixing = [g for g in automorphisms if all(g[p] == p for p in path)]
+                if fixing and any(_same_orbit(v, e, fixing) for e in explored):
+                    continue
+
+            explored.append(v)
+            rest = [u for u in cells[t] if u != v]
+            search(cells[:t] + [[v], rest] + cells[t + 1:], path + [v])
+
+    search([list(range(n))], [])
+    return best[0]
+
+
+def _same_orbit(u: int, v: int, generators: list[tuple[int, ...]]) -> bool:
+    reached = {u}
+    frontier = [u]
+    while frontier:
+        w = frontier.pop()
+        for g in generators:
+            x = g[w]
+            if x not in reached:
+                reached.add(x)
+                frontier.append(x)
+    return v in reached
+
+
+def _refine_key(n: int, adj: list[int]) -> Hashable:
+    return (n, canonical_code(n, adj))
+
+
+def _pynauty_key(n: int, adj: list[int]) -> Hashable:
+    import pynauty
+
+    adjacency = {v: [u for u in range(n) if (adj[v] >> u) & 1] for v in range(n)}
+    return (n, pynauty.certificate(pynauty.Graph(n, adjacency_dict=adjacency)))
+
+
+def _wl_key(n: int, adj: list[int]) -> Hashable:
+    G = nx.Graph()
+    G.add_nodes_from(range(n))
+    G.add_edges_from((v, u) for v in range(n) for u in range(v + 1, n) if (adj[v] >> u) & 1)
+    return nx.weisfeiler_lehman_graph_hash(G, iterations=8)
+
+
+# Canonical key functions by backend name. Only refine and pynauty are exact,
+# wl is the Weisfeiler-Lehman hash used previously and may merge classes.
+backends = {
+    "refine": _refine_key,
+    "pynauty": _pynauty_key,
+    "wl": _wl_key,
+}
+
+
+def set_backend(name: str | None = None) -> str:
+    """
+    Selects the canonical labelling backend. Without a name, pynauty is used
+    when it is installed and refine otherwise.
+    """
+    global backend
+
+    if name is None:
+        try:
+            import pynauty  # noqa: F401
+
+            name = "pynauty"
+        except ImportError:
+            name = "refine"
+
+    if name not in backends:
+        raise ValueError(f"Unknown canonical labelling backend {name}")
+
+    backend = name
+    return backend
+
+
+def canonical_key(n: int, adj: list[int]) -> Hashable:
+    if backend is None:
+        set_backend()
+    return backends[backend](n, adj)
+
+
+def canonical_graph_key(G: nx.Graph) -> Hashable:
+    return canonical_key(*graph_adjacency(G))
+
+
+class IsomorphismFilter:
+    """
+    Keeps one representative per isomorphism class of the graphs added to it.
+
+    Graphs are first bucketed by a cheap invariant. Canonical keys are only
+    computed once a second graph lands in the same bucket, so graphs with a
+    unique invariant never pay for canonical labelling.
+    """
+
+    def __init__(self):
+        # Invariant -> pending graph of the first class, or key of every class,
+        # each along with the index of its class
+        self.buckets: dict[Hashable, tuple[int, list[int], int] | dict[Hashable, int]] = {}
+        self.classes = 0
+        self.added = 0
+        self.canonical_computed = 0
+        self.prefilter_accepted = 0
+
+    def add_adjacency(self, n: int, adj: list[int]) -> bool:
+        """
+        Returns whether the graph is the first of its isomorphism class.
+        """
+        return self.classify_adjacency(n, adj)[1]
+
+    def classify_adjacency(self, n: int, adj: list[int]) -> tuple[int, bool]:
+        """
+        Returns the index of the isomorphism class of the graph, counting
+        classes from 0 in the order they are first seen, and whether the
+        graph is the first of its class.
+        """
+        self.added += 1
+        inv = invariant(n, adj)
+        entry = self.buckets.get(inv)
+
+        # First graph with this invariant is new without further checks
+        if entry is None:
+            self.buckets[inv] = (n, adj, self.classes)
+            self.classes += 1
+            self.prefilter_accepted += 1
+            instrumentation.count("isomorphism prefilter accepted")
+            return self.classes - 1, True
+
+        with instrumentation.timed("canonical labelling"):
+
+            # Resolve the pending graph of the bucket
+            if isinstance(entry, tuple):
+                entry = {canonical_key(entry[0], entry[1]): entry[2]}
+                self.canonical_computed += 1
+                instrumentation.count("canonical keys")
+                self.buckets[inv] = entry
+
+            key = canonical_key(n, adj)
+            self.canonical_computed += 1
+            instrumentation.count("canonical keys")
+
+        cls = entry.get(key)
+        if cls is not None:
+            return cls, False
+        entry[key] = self.classes
+        self.classes += 1
+        return self.classes - 1, True
+
+    def add(self, G: nx.Graph) -> bool:
+        return self.add_adjacency(*graph_adjacency(G))
+
+
+def test_canonical():
+    import random
+
+    rng = random.Random(0)
+    failed = False
+
+    # Random graphs, their random relabellings and some symmetric ones
+    graphs = [nx.gnp_random_graph(rng.randint(1, 10), rng.random(), seed=s) for s in range(150)]
+    graphs += [nx.complete_graph(8), nx.petersen_graph(), nx.cycle_graph(12)]
+    graphs += [nx.hypercube_graph(3), nx.grid_2d_graph(3, 4), nx.complete_bipartite_graph(3, 4)]
+
+    keys = []
+    for g in graphs:
+        key = canonical_graph_key(g)
+        nodes = list(g.nodes)
+        shuffled = nodes[:]
+        rng.shuffle(shuffled)
+        h = nx.relabel_nodes(g, dict(zip(nodes, shuffled)))
+        if canonical_graph_key(h) != key:
+            print("DIFFERENT KEYS FOR ISOMORPHIC GRAPHS", g.edges)
+            failed = True
+        keys.append(key)
+
+    # Keys must agree exactly when the graphs are isomorphic
+    for i in range(len(graphs)):
+        for j in range(i + 1, len(graphs)):
+            if (keys[i] == keys[j]) != nx.is_isomorphic(graphs[i], graphs[j]):
+                print("WRONG KEYS FOR", graphs[i].edges, graphs[j].edges)
+                failed = True
+
+    # The filter keeps exactly one graph per class
+    filt = IsomorphismFilter()
+    kept = [g for g in graphs if filt.add(g)]
+    for i in range(len(kept)):
+        for j in range(i + 1, len(kept)):
+            if nx.is_isomorphic(kept[i], kept[j]):
+                print("FILTER KEPT ISOMORPHIC GRAPHS")
+                failed = True
+    if len(kept) != len(set(keys)):
+        print("FILTER DROPPED A CLASS")
+        failed = True
+
+    # Classes are numbered in order of appearance and shared by isomorphic graphs
+    filt = IsomorphismFilter()
+    classes = [filt.classify_adjacency(*graph_adjacency(g))[0] for g in graphs]
+    if sorted(set(classes)) != list(range(filt.classes)) or any(
+        (classes[i] == classes[j]) != (keys[i] == keys[j])
+        for i in range(len(graphs))
+        for j in range(i + 1, len(graphs))
+    ):
+        print("WRONG CLASSES")
+        failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_canonical()
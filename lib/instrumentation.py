@@ -0,0 +1,183 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Iterable, Iterator, TypeVar
+
+Item = TypeVar("Item")
+
+# Counters and accumulated seconds per stage of the current run. The timer
+# of a stage includes the stages nested in it unless they are excluded with
+# timed_excluding. Work done in worker processes is only included where the
+# workers return their counts to the parent.
+counters: dict[str, int] = defaultdict(int)
+timers: dict[str, float] = defaultdict(float)
+
+# Whether timed_iter times every single item. Its clock reads are noticeable on
+# the fastest enumeration loops, so it is off unless asked for. Stages named
+# with stage() then also hold the time of the items they consume, e.g.
+# "enumeration + induced extraction" where the union products of the tree
+# engine are part of the enumeration.
+detailed: bool = False
+
+
+def count(name: str, n: int = 1) -> None:
+    counters[name] += n
+
+
+def add_time(name: str, seconds: float) -> None:
+    timers[name] += seconds
+
+
+@contextmanager
+def timed(name: str):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timers[name] += perf_counter() - start
+
+
+@contextmanager
+def timed_excluding(name: str, *inner: str):
+    """
+    Times the block like timed, minus whatever the block adds to the timers
+    of inner, so nested stages are not counted twice.
+    """
+    start = perf_counter()
+    before = sum(timers.get(i, 0.0) for i in inner)
+    try:
+        yield
+    finally:
+        nested = sum(timers.get(i, 0.0) for i in inner) - before
+        timers[name] += perf_counter() - start - nested
+
+
+def timed_iter(name: str, items: Iterable[Item]) -> Iterator[Item]:
+    """
+    Yields the items, adding the time spent producing them to the timer of
+    name. Time spent by the consumer between items is not included.
+    Returns the items untouched unless detailed is set.
+    """
+    if not detailed:
+        return items
+    return _timed_iter(name, items)
+
+
+def stage(name: str, *iterated: str) -> str:
+    """
+    Name of the timer of a stage consuming items timed by timed_iter under
+    iterated. Unless detailed is set those are not timed on their own, so
+    the stage includes them and its name lists them first.
+    """
+    if detailed:
+        return name
+    return " + ".join((*iterated, name))
+
+
+def _timed_iter(name: str, items: Iterable[Item]) -> Iterator[Item]:
+    it = iter(items)
+    elapsed = 0.0
+    try:
+        while True:
+            start = perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                elapsed += perf_counter() - start
+                return
+            elapsed += perf_counter() - start
+            yield item
+    finally:
+        timers[name] += elapsed
+
+
+def reset() -> None:
+    counters.clear()
+    timers.clear()
+
+
+def report(**meta: Any) -> dict[str, Any]:
+    return {
+        "meta": meta,
+        "detailed": detailed,
+        "timers": {name: round(t, 6) for name, t in sorted(timers.items())},
+        "counters": dict(sorted(counters.items())),
+    }
+
+
+def dump(path: str, **meta: Any) -> dict[str, Any]:
+    """
+    Writes the report of the current run as JSON to path and returns it.
+    """
+    import json
+
+    data = report(**meta)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, default=str)
+    return data
+
+
+# Location of the report belonging to a CSV file of results
+def report_path(csv_path: str) -> str:
+    import os
+
+    return os.path.splitext(csv_path)[0] + ".report.json"
+
+
+def test_instrumentation():
+    import time
+
+    failed = False
+    reset()
+
+    count("things")
+    count("things", 2)
+    with timed("sleep"):
+        time.sleep(0.01)
+
+    # Consumer time must not be charged to the producer
+    global detailed
+    detailed = True
+    for _ in timed_iter("producer", range(3)):
+        time.sleep(0.01)
+    detailed = False
+
+    # Nested stages are excluded from the enclosing one
+    with timed_excluding("outer", "inner"):
+        with timed("inner"):
+            time.sleep(0.01)
+
+    # Without per-item timing the consuming stage is named for what it includes
+    if stage("outer", "producer") != "producer + outer":
+        print("WRONG STAGE NAME", stage("outer", "producer"))
+        failed = True
+    detailed = True
+    if stage("outer", "producer") != "outer":
+        print("WRONG DETAILED STAGE NAME", stage("outer", "producer"))
+        failed = True
+    detailed = False
+
+    data = report(test=True)
+    if data["timers"]["outer"] >= 0.005:
+        print("NESTED TIME COUNTED TWICE", data["timers"])
+        failed = True
+    if data["counters"] != {"things": 3}:
+        print("WRONG COUNTERS", data["counters"])
+        failed = True
+    if not data["timers"]["sleep"] >= 0.01 or not data["timers"]["producer"] < 0.01:
+        print("WRONG TIMERS", data["timers"])
+        failed = True
+
+    reset()
+    if counters or timers:
+        print("RESET FAILED")
+        failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_instrumentation()
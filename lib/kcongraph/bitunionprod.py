@@ -0,0 +1,152 @@
+from typing import TypeAlias, Iterable, Iterator
+
+# Type aliases used here
+Node: TypeAlias = int
+# A candidate set of tree nodes together with
+# - the bitmask of the vertices it covers
+# - the bitmask of the vertices of all children of its nodes
+# - whether any of its nodes carries the NEW mark
+Candidate: TypeAlias = tuple[list[Node], int, int, bool]
+
+
+# Computes the Refined Union Product by backtracking over bitmasks
+def bit_union_product(sets: list[list[Candidate]]) -> Iterator[Candidate]:
+    """
+    Yields every way of picking one candidate from each set such that, for
+    every pair of picks a (earlier) and b (later), a and b are vertex disjoint
+    and either b has a NEW node or no child of a is a vertex of b.
+
+    Since both constraints only ever compare a later pick to the union of the
+    earlier ones, the vertex and children masks are accumulated along the
+    search and each check is a single bitwise AND.
+    """
+
+    # Follow initial constraints
+    n = len(sets)
+    if n == 0 or any(len(s) == 0 for s in sets):
+        return
+    if n == 1:
+        yield from sets[0]
+        return
+
+    # Accumulated masks of the picks before each position
+    vmasks: list[int] = [0] * (n + 1)
+    cmasks: list[int] = [0] * (n + 1)
+    news: list[bool] = [False] * (n + 1)
+    chosen: list[list[Node]] = [[] for _ in range(n)]
+    iters: list[Iterator[Candidate]] = [iter(())] * n
+
+    # Perform the backtracking search
+    pos = 0
+    iters[0] = iter(sets[0])
+    while pos >= 0:
+
+        for nodes, vmask, cmask, new in iters[pos]:
+
+            # Check vertex_disjoint against all earlier picks
+            if vmask & vmasks[pos]:
+                continue
+
+            # Check hasmark_new or nochildren_of against all earlier picks
+            if not new and vmask & cmasks[pos]:
+                continue
+
+            chosen[pos] = nodes
+            vmasks[pos + 1] = vmasks[pos] | vmask
+            cmasks[pos + 1] = cmasks[pos] | cmask
+            news[pos + 1] = news[pos] or new
+
+            # Either emit a full product or descend to the next set
+            if pos == n - 1:
+                yield (sum(chosen, []), vmasks[n], cmasks[n], news[n])
+            else:
+                pos += 1
+                iters[pos] = iter(sets[pos])
+                break
+        else:
+            # Exhausted this position, so backtrack
+            pos -= 1
+
+
+# Builds a candidate from its nodes and per-node masks and marks
+def make_candidate(
+    nodes: Iterable[Node],
+    vmask: dict[Node, int],
+    cmask: dict[Node, int],
+    new: Iterable[Node],
+) -> Candidate:
+    nodes = list(nodes)
+    v = c = 0
+    for n in nodes:
+        v |= vmask[n]
+        c |= cmask[n]
+    return (nodes, v, c, not set(new).isdisjoint(nodes))
+
+
+# Cross-check against the CSP formulation in refunionprod
+def test_bup():
+    if __package__:
+        from lib.kcongraph.refunionprod import ref_union_product
+    else:
+        from refunionprod import ref_union_product
+
+    # Same fake tree as in refunionprod.test_rup
+    children = {
+        1: set([2, 6, 8]),
+        2: set([3, 5]),
+        3: set([4]),
+        4: set(),
+        5: set([9]),
+        6: set([7]),
+        7: set(),
+        8: set(),
+        9: set(),
+    }
+    vertices = {1: "a", 2: "b", 3: "c", 4: "d", 5: "d", 6: "d", 7: "c", 8: "e", 9: "f"}
+    new = set([1, 2, 3, 4, 8])
+
+    # Assign a bit to every vertex
+    bits = {v: 1 << i for i, v in enumerate(sorted(set(vertices.values())))}
+    vmask = {n: bits[v] for n, v in vertices.items()}
+    cmask = {n: sum(set(bits[vertices[c]] for c in cs)) for n, cs in children.items()}
+
+    def vertex_disjoint(s1, s2) -> bool:
+        return set(vertices[n] for n in s1).isdisjoint(vertices[n] for n in s2)
+
+    def hasmark_new(s) -> bool:
+        return not new.isdisjoint(s)
+
+    def nochildren_of(s1, s2) -> bool:
+        c1 = set(vertices[c] for n in s1 for c in children[n])
+        return c1.isdisjoint(vertices[n] for n in s2)
+
+    cases = [
+        [[[2]], [[6, 7]]],
+        [[[2, 3], [2, 5]], [[6]]],
+        [[[2, 3], [2, 5]], [[8]]],
+        [[[6, 7]], [[8]]],
+        [[], [[1], [2], [3]]],
+        [[[7], [8], [9]]],
+        [[[2, 3], [2, 5]], [[8]], [[9]]],
+        [[[7], [8], [9]], [[2], [6]], [[3], [5], [4]]],
+    ]
+
+    failed = False
+    for sets in cases:
+        expected = ref_union_product(sets, vertex_disjoint, hasmark_new, nochildren_of)
+        bsets = [[make_candidate(s, vmask, cmask, new) for s in ss] for ss in sets]
+        actual = [c[0] for c in bit_union_product(bsets)]
+        if sorted(map(sorted, expected)) != sorted(map(sorted, actual)):
+            print("ERRONEOUS ON", sets)
+            print(expected)
+            print(actual)
+            failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_bup()
@@ -0,0 +1,132 @@
+import networkx as nx
+from typing import Hashable, Iterable, Iterator
+
+
+# Graph relabelled to the vertices 0..n-1 in the node order of the original graph.
+# Vertex i is represented by the bit 1 << i, so vertex sets are plain integers,
+# and adjacency is stored both as neighbour tuples and as neighbour bitmasks.
+class CompactGraph:
+    __slots__ = ("labels", "index", "n", "nbrs", "masks", "edges", "edge_index")
+
+    def __init__(self, labels: Iterable[Hashable], edges: Iterable[tuple[Hashable, Hashable]]):
+        self.labels: tuple[Hashable, ...] = tuple(labels)
+        self.index: dict[Hashable, int] = {v: i for i, v in enumerate(self.labels)}
+        self.n: int = len(self.labels)
+
+        # Relabel the edges, keeping their original order and orientation
+        self.edges: tuple[tuple[int, int], ...] = tuple(
+            (self.index[u], self.index[v]) for u, v in edges
+        )
+        self.edge_index: dict[tuple[int, int], int] = {}
+        for idx, (u, v) in enumerate(self.edges):
+            self.edge_index[(u, v)] = idx
+            self.edge_index[(v, u)] = idx
+
+        # Build neighbour lists and masks
+        nbrs: list[list[int]] = [[] for _ in range(self.n)]
+        masks: list[int] = [0] * self.n
+        for u, v in self.edges:
+            nbrs[u].append(v)
+            nbrs[v].append(u)
+            masks[u] |= 1 << v
+            masks[v] |= 1 << u
+        self.nbrs: tuple[tuple[int, ...], ...] = tuple(map(tuple, nbrs))
+        self.masks: tuple[int, ...] = tuple(masks)
+
+    @classmethod
+    def from_networkx(cls, G: nx.Graph) -> "CompactGraph":
+        return cls(G.nodes, G.edges)
+
+    def mask_of(self, vertices: Iterable[Hashable]) -> int:
+        mask = 0
+        for v in vertices:
+            mask |= 1 << self.index[v]
+        return mask
+
+    def indices_of(self, mask: int) -> Iterator[int]:
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def labels_of(self, mask: int) -> list[Hashable]:
+        return [self.labels[i] for i in self.indices_of(mask)]
+
+    def is_connected(self, mask: int) -> bool:
+        """
+        Checks whether the subgraph induced by the vertices in mask is connected.
+        """
+        if mask == 0:
+            return False
+
+        # Grow the component of the lowest vertex until it stops changing
+        reached = mask & -mask
+        frontier = reached
+        masks = self.masks
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            new = masks[low.bit_length() - 1] & mask & ~reached
+            reached |= new
+            frontier |= new
+        return reached == mask
+
+    def induced_edges(self, mask: int) -> list[tuple[int, int]]:
+        return [(u, v) for u, v in self.edges if (mask >> u) & 1 and (mask >> v) & 1]
+
+    def edges_connected(self, emask: int) -> bool:
+        """
+        Checks whether all vertices are connected using only the edges in emask.
+        """
+        if self.n == 0:
+            return False
+
+        # Neighbour masks restricted to the chosen edges
+        masks = [0] * self.n
+        for u, v in self.edges_of(emask):
+            masks[u] |= 1 << v
+            masks[v] |= 1 << u
+
+        full = (1 << self.n) - 1
+        reached = frontier = 1
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            new = masks[low.bit_length() - 1] & ~reached
+            reached |= new
+            frontier |= new
+        return reached == full
+
+    def edges_of(self, emask: int) -> Iterator[tuple[int, int]]:
+        for idx in self.indices_of(emask):
+            yield self.edges[idx]
+
+    def to_networkx(self, mask: int | None = None) -> nx.Graph:
+        """
+        Builds the subgraph induced by the vertices in mask (default all of them)
+        with the original vertex labels.
+        """
+        if mask is None:
+            mask = (1 << self.n) - 1
+        G = nx.Graph()
+        G.add_nodes_from(self.labels[i] for i in range(self.n) if (mask >> i) & 1)
+        G.add_edges_from(
+            (self.labels[u], self.labels[v]) for u, v in self.induced_edges(mask)
+        )
+        return G
+
+    def edge_subgraph_to_networkx(self, emask: int) -> nx.Graph:
+        """
+        Builds the spanning subgraph consisting of all vertices and the edges in emask.
+        """
+        G = nx.Graph()
+        G.add_nodes_from(self.labels)
+        G.add_edges_from((self.labels[u], self.labels[v]) for u, v in self.edges_of(emask))
+        return G
+
+
+# Converts to the compact representation unless already given one
+def as_compact(G: nx.Graph | CompactGraph) -> CompactGraph:
+    if isinstance(G, CompactGraph):
+        return G
+    return CompactGraph.from_networkx(G)
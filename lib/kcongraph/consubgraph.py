@@ -1,37 +1,54 @@
 import networkx as nx
-from typing import Iterable, TypeVar, TypeAlias, Callable
-from collections import defaultdict
+from typing import Iterable, Iterator, TypeVar, TypeAlias, Hashable
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from enum import Enum
 
 
-# Wrapper for performing memoization of heavy computations
-def init_memoization(core_fun: Callable) -> Callable:
+# Memoization table for heavy computations, optionally bounded in size.
+# When bounded, the least recently used entries are evicted first.
+class Memo:
+    def __init__(self, maxsize: int | None = None):
+        self.maxsize = maxsize
+        self.table: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
-    # Memoization dictionary
-    mem = {}
+    def lookup(self, key: Hashable):
+        res = self.table.get(key)
+        if res is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self.maxsize is not None:
+            self.table.move_to_end(key)
+        return res
 
-    # Construct wrapper
-    def wrapper(*args):
-        print(args)
-        print(*args)
-        if args in mem.keys():
-            return mem[args]
-        else:
-            res = core_fun(*args)
-            mem[args] = res
-            return res
+    def store(self, key: Hashable, value) -> None:
+        self.table[key] = value
+        if self.maxsize is not None and len(self.table) > self.maxsize:
+            self.table.popitem(last=False)
 
-    # Return wrapper
-    return wrapper
+    def clear(self) -> None:
+        self.table.clear()
 
 
-if __name__ != "__main__":
+if __package__:
     from lib.kcongraph.kcombinations import k_combinations, fixed_sum_k_combinations
-    from lib.kcongraph.refunionprod import ref_union_product
+    from lib.kcongraph.bitunionprod import bit_union_product, Candidate
+    from lib.kcongraph.compactgraph import CompactGraph, as_compact
+    from lib.kcongraph.parallel import iter_rooted_masks_parallel
+    from lib import instrumentation
 else:
+    import os
+    import sys
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from lib import instrumentation
     from kcombinations import k_combinations, fixed_sum_k_combinations
-    from refunionprod import ref_union_product
+    from bitunionprod import bit_union_product, Candidate
+    from compactgraph import CompactGraph, as_compact
+    from parallel import iter_rooted_masks_parallel
 
 T: TypeAlias = int
 NT: TypeAlias = int
@@ -46,53 +63,59 @@ class Mark(Enum):
 
 
 # TreeNode class used for tree structure
+# vmask is the bit of the vertex, cmask the bits of the vertices of its children
 @dataclass
 class TreeNode:
     ident: T
     idx: int
     children: Iterable[int] = field(default_factory=list)
     mark: Mark = Mark.NONE
+    vmask: int = 0
+    cmask: int = 0
 
 
 NodeMap: TypeAlias = dict[NT, TreeNode]
 
 
-def __make_vertex_disjoint_constraint(nm: NodeMap):
-    def vertex_disjoint(s1: Iterable[TreeNode], s2: Iterable[TreeNode]) -> bool:
-        v1 = map(lambda tn: nm[tn].ident, s1)
-        v2 = map(lambda tn: nm[tn].ident, s2)
-        return set(v1).isdisjoint(set(v2))
-
-    return vertex_disjoint
+def combinations_from_tree(
+    nodemap: NodeMap, root: TreeNode, k: int
+) -> Iterable[Iterable[NT]]:
+    return [c[0] for c in iter_masked_combinations_from_tree(nodemap, root, k)]
 
 
-def __make_hasmark_new_constraint(nm: NodeMap):
-    def hasmark_new(s: Iterable[TreeNode]) -> bool:
-        return Mark.NEW in set(map(lambda tn: nm[tn].mark, s))
+def iter_combinations_from_tree(
+    nodemap: NodeMap, root: TreeNode, k: int
+) -> Iterator[Iterable[NT]]:
+    for c in iter_masked_combinations_from_tree(nodemap, root, k):
+        yield c[0]
 
-    return hasmark_new
 
+def masked_combinations_from_tree(
+    nodemap: NodeMap, root: TreeNode, k: int, memo: Memo | None = None
+) -> list[Candidate]:
 
-def __make_nochildren_of_contraint(nm: NodeMap):
-    def nochildren_of(s1: Iterable[TreeNode], s2: Iterable[TreeNode]) -> bool:
-        c1 = sum(list(map(lambda tn: nm[tn].children, s1)), [])
-        v1 = map(lambda tn: nm[tn].ident, c1)
-        v2 = map(lambda tn: nm[tn].ident, s2)
-        return set(v1).isdisjoint(set(v2))
+    if memo is None:
+        return list(iter_masked_combinations_from_tree(nodemap, root, k))
 
-    return nochildren_of
+    # Each (tree node, size) pair is solved once per tree
+    key = (root.idx, k)
+    res = memo.lookup(key)
+    if res is None:
+        res = list(iter_masked_combinations_from_tree(nodemap, root, k, memo))
+        memo.store(key, res)
+    return res
 
 
-def combinations_from_tree(
-    nodemap: NodeMap, root: TreeNode, k: int
-) -> Iterable[Iterable[NT]]:
+def iter_masked_combinations_from_tree(
+    nodemap: NodeMap, root: TreeNode, k: int, memo: Memo | None = None
+) -> Iterator[Candidate]:
 
-    # Variable to hold result
-    lnodesets: Iterable[Iterable[NT]] = []
+    root_new: bool = root.mark == Mark.NEW
 
     # Base case
     if k == 1:
-        return [[root.idx]]
+        yield ([root.idx], root.vmask, root.cmask, root_new)
+        return
 
     # Try every combination of various sizes
     for i in range(1, min(len(root.children), k - 1) + 1):
@@ -103,14 +126,16 @@ def combinations_from_tree(
             for comp in fixed_sum_k_combinations(i, k - 1):
 
                 fail: bool = False
-                Ss: list[Iterable[Iterable[T]]] = [[[]] for _ in range(i)]
+                Ss: list[list[Candidate]] = [[] for _ in range(i)]
 
                 for pos in range(0, i):
 
                     subtree_root: TreeNode = nodemap[comb[pos]]
                     size: int = comp[pos]
 
-                    Ss[pos] = combinations_from_tree(nodemap, subtree_root, size)
+                    Ss[pos] = masked_combinations_from_tree(
+                        nodemap, subtree_root, size, memo
+                    )
                     if len(Ss[pos]) == 0:
                         fail = True
                         break
@@ -119,90 +144,181 @@ def combinations_from_tree(
                     continue
 
                 # Create all combinations
-                const_1 = __make_vertex_disjoint_constraint(nodemap)
-                const_2 = __make_hasmark_new_constraint(nodemap)
-                const_3 = __make_nochildren_of_contraint(nodemap)
-
-                union_prod = ref_union_product(Ss, const_1, const_2, const_3)
-                for comb_prod in union_prod:
-                    lnodesets.append(([root.idx] + comb_prod))
-
-    return lnodesets
-
-
-def size_k_combinations_with_v(v: T, k: int, G: nx.Graph) -> Iterable[Iterable[T]]:
+                for nodes, vmask, cmask, new in bit_union_product(Ss):
+                    yield (
+                        [root.idx] + nodes,
+                        root.vmask | vmask,
+                        root.cmask | cmask,
+                        root_new or new,
+                    )
+
+
+def build_combination_tree(
+    v: int, k: int, G: CompactGraph, floor: int = 0
+) -> tuple[NodeMap, TreeNode]:
+    """
+    Builds the combination tree of depth k rooted at vertex index v of G.
+    Vertices with an index below floor are treated as removed from G.
+    """
 
     # Build combination tree
     nodemap: NodeMap = dict()
     root: TreeNode = TreeNode(v, 0)
+    root.vmask = 1 << v
     nodemap[0] = root
 
-    # Initalize list
-    lst: list[Iterable[T]] = [[] for _ in range(k + 1)]  # Need larger size
-    lst[0].append(v)
+    # Initalize masks of ancestors and their siblings
+    lst: list[int] = [0 for _ in range(k + 1)]  # Need larger size
+    lst[0] = root.vmask
+
+    # Initialize marks for vertices, all vertices not in visited are unmarked
+    visited: int = 0
 
-    # Initialize marks for vertices
-    v_marks = defaultdict(lambda: Mark.NONE)
+    # Vertices below floor are never added
+    removed: int = (1 << floor) - 1
 
     # Helper function to build the tree
-    def build_tree(
-        nodemap: NodeMap, root: TreeNode, depth: int, G: nx.Graph, k: int
-    ) -> None:
+    def build_tree(nodemap: NodeMap, root: TreeNode, depth: int, k: int) -> None:
+        nonlocal visited
 
-        # Update list with ancestors
-        lst[depth] = lst[depth - 1].copy()
+        # Update mask with ancestors
+        lst[depth] = lst[depth - 1] | removed
 
         # Examine each neighbor vertex
-        for v in G.neighbors(root.ident):
+        for v in G.nbrs[root.ident]:
+            vmask: int = 1 << v
 
             # If we are ancestor, sibling or sibling of ancestor
-            if v in lst[depth]:
+            if vmask & lst[depth]:
                 # Skip
                 continue
 
             # Add as child
             nt_id: int = len(nodemap)
             nt: TreeNode = TreeNode(v, nt_id)
+            nt.vmask = vmask
             nodemap[nt_id] = nt
             root.children.append(nt_id)
-            lst[depth].append(v)
+            root.cmask |= vmask
+            lst[depth] |= vmask
 
             # Handle marks
-            if v_marks[v] != Mark.VISITED:
+            if not vmask & visited:
                 nt.mark = Mark.NEW
-                v_marks[v] = Mark.VISITED
+                visited |= vmask
             else:
                 nt.mark = Mark.SEEN
 
             # Call recursively with this node as root
             if depth + 1 <= k:
-                build_tree(nodemap, nt, depth + 1, G, k)
+                build_tree(nodemap, nt, depth + 1, k)
 
         return
 
     # Build tree
-    build_tree(nodemap, root, 1, G, k)
+    build_tree(nodemap, root, 1, k)
 
-    # Map found combinations into their respective vertices
-    combinations: Iterable[Iterable[NT]] = combinations_from_tree(nodemap, root, k)
+    return nodemap, root
 
-    def nodemap_mapper(nlist: Iterable[NT]) -> Iterable[T]:
-        return list(map(lambda v: nodemap[v].ident, nlist))
 
-    # and return them
-    return list(map(nodemap_mapper, combinations))
+def size_k_combinations_with_v(
+    v: T, k: int, G: nx.Graph | CompactGraph, memo: Memo | None = None
+) -> Iterable[Iterable[T]]:
+    return list(iter_size_k_combinations_with_v(v, k, G, memo))
 
 
-def size_k_connected_subgraphs_tree(G: nx.Graph, k: int) -> Iterable[nx.Graph]:
+def iter_size_k_combinations_with_v(
+    v: T, k: int, G: nx.Graph | CompactGraph, memo: Memo | None = None
+) -> Iterator[Iterable[T]]:
+    cg = as_compact(G)
+    for mask in iter_size_k_masks_with_v(cg.index[v], k, cg, 0, memo):
+        yield cg.labels_of(mask)
 
-    combinations: Iterable[nx.Graph] = []
-    Gp = nx.Graph(G)
 
-    for v in G.nodes:
-        combinations += size_k_combinations_with_v(v, k, Gp)
-        Gp.remove_node(v)
+def iter_size_k_masks_with_v(
+    v: int, k: int, G: CompactGraph, floor: int = 0, memo: Memo | None = None
+) -> Iterator[int]:
 
-    return combinations
+    # Build combination tree
+    with instrumentation.timed("tree build"):
+        nodemap, root = build_combination_tree(v, k, G, floor)
+    instrumentation.count("tree nodes", len(nodemap))
+
+    # Memoized results are keyed on tree nodes, so start a fresh table
+    if memo is None:
+        memo = Memo()
+    memo.clear()
+    hits, misses = memo.hits, memo.misses
+
+    # The vertex mask of a combination is the set of vertices it covers
+    solutions = 0
+    combinations = iter_masked_combinations_from_tree(nodemap, root, k, memo)
+    try:
+        for _, vmask, _, _ in instrumentation.timed_iter("union product", combinations):
+            solutions += 1
+            yield vmask
+    finally:
+        # Every memo miss solves the union product problems of one subtree and size
+        instrumentation.count("tree solutions", solutions)
+        instrumentation.count("csp problems", memo.misses - misses)
+        instrumentation.count("memo hits", memo.hits - hits)
+
+
+def size_k_connected_subgraphs_tree(
+    G: nx.Graph | CompactGraph,
+    k: int,
+    memo: Memo | None = None,
+    workers: int | None = None,
+) -> Iterable[Iterable[T]]:
+    return list(iter_size_k_connected_subgraphs_tree(G, k, memo, workers))
+
+
+def iter_size_k_connected_subgraphs_tree(
+    G: nx.Graph | CompactGraph,
+    k: int,
+    memo: Memo | None = None,
+    workers: int | None = None,
+) -> Iterator[Iterable[T]]:
+    """
+    Lazily yields every connected set of k vertices of G, one at a time.
+    Only the combination tree of the current root vertex is kept in memory.
+
+    Subtree results are memoized per tree in memo, which is cleared for every
+    root vertex. Pass Memo(maxsize) to bound it, and read its hits and misses
+    afterwards to see how well it did.
+
+    With workers > 1 the root vertices are spread over a pool of worker
+    processes, each with its own memo, and sets are yielded per finished root.
+    """
+    cg = as_compact(G)
+    for mask in iter_size_k_connected_masks_tree(cg, k, memo, workers):
+        yield cg.labels_of(mask)
+
+
+def iter_size_k_connected_masks_tree(
+    G: CompactGraph, k: int, memo: Memo | None = None, workers: int | None = None
+) -> Iterator[int]:
+    """
+    Same as iter_size_k_connected_subgraphs_tree, but yields vertex bitmasks of G.
+    """
+
+    if workers is not None and workers > 1:
+        yield from iter_rooted_masks_parallel(G, k, size_k_masks_rooted_tree, workers)
+        return
+
+    if memo is None:
+        memo = Memo()
+
+    # Root at every vertex, with all earlier roots removed
+    for v in range(G.n):
+        yield from iter_size_k_masks_with_v(v, k, G, v, memo)
+
+    memo.clear()
+
+
+# Yields every connected set of k vertices whose lowest vertex is v
+def size_k_masks_rooted_tree(G: CompactGraph, k: int, v: int) -> Iterator[int]:
+    return iter_size_k_masks_with_v(v, k, G, v)
 
 
 def test_size_k_connected_subgraphs():
@@ -258,13 +374,19 @@ def test_size_k_connected_subgraphs():
     # Test for various graphs
     from collections import Counter
 
+    # Complete graphs and a few sparser ones with repeated vertices in the tree
+    graphs = [nx.complete_graph(n) for n in range(1, 8)]
+    graphs += [nx.petersen_graph(), nx.grid_2d_graph(3, 3), nx.wheel_graph(7)]
+
     failed = False
-    for n in range(1, 8):
-        g = nx.complete_graph(n)
-        for k in range(1, n + 1):
+    for g in graphs:
+        for k in range(1, min(len(g), 7) + 1):
             combs_1 = k_connected_bf(g, k)
             combs_2 = k_connected_tr(g, k)
-            if Counter(combs_1) != Counter(combs_2):
+            combs_3 = list(map(frozenset, iter_size_k_connected_subgraphs_tree(g, k)))
+            combs_4 = list(map(frozenset, size_k_connected_subgraphs_tree(g, k, Memo(4))))
+            counts = [Counter(c) for c in (combs_1, combs_2, combs_3, combs_4)]
+            if any(c != counts[0] for c in counts):
                 print("ERRONEOUS ON")
                 print(g, g.nodes, g.edges)
                 print(combs_1)
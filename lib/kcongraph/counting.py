@@ -0,0 +1,92 @@
+import networkx as nx
+
+if __package__:
+    from lib.kcongraph.compactgraph import CompactGraph
+    from lib.kcongraph.esu import iter_esu_nodes
+    from lib.kcongraph.parallel import count_rooted_parallel
+else:
+    from compactgraph import CompactGraph
+    from esu import iter_esu_nodes
+    from parallel import count_rooted_parallel
+
+
+def count_size_k_rooted(G: CompactGraph, k: int, v: int) -> int:
+    """
+    Counts the connected sets of k vertices of G whose lowest vertex is v,
+    without ever building them.
+
+    Walks the ESU search tree of size_k_masks_rooted_esu, holding only the
+    stack of open branches. A set one vertex short of k has one completion
+    per vertex of its extension set, and a set two short one per vertex of
+    the extension set of each child, so the last two levels are counted
+    from popcounts instead of being visited.
+    """
+
+    if k <= 0:
+        return 0
+    if k == 1:
+        return 1
+
+    masks = G.masks
+    vbit = 1 << v
+    above = ~((vbit << 1) - 1)
+    if k == 2:
+        return (masks[v] & above).bit_count()
+
+    # Every child has as many completions as its extension set has vertices
+    total = 0
+    for _, ext, nbhd, size in iter_esu_nodes(G, v, k - 2):
+        if size == k - 2:
+            while ext:
+                w = ext & -ext
+                ext ^= w
+                total += (ext | (masks[w.bit_length() - 1] & ~nbhd & above)).bit_count()
+
+    return total
+
+
+def count_size_k_connected_sets_per_root(G: CompactGraph, k: int, workers: int | None = None) -> list[int]:
+    """
+    Returns, for every vertex v of G, the number of connected sets of k
+    vertices whose lowest vertex is v. They sum to the number of connected
+    sets, and show how unevenly the work is spread over the roots.
+
+    With workers > 1 the roots are counted in a pool of worker processes.
+    """
+    if workers is not None and workers > 1:
+        return count_rooted_parallel(G, k, count_size_k_rooted, workers)
+    return [count_size_k_rooted(G, k, v) for v in range(G.n)]
+
+
+def test_count_size_k_rooted():
+
+    if __package__:
+        from lib.kcongraph.esu import size_k_masks_rooted_esu
+    else:
+        from esu import size_k_masks_rooted_esu
+
+    graphs = [nx.complete_graph(6), nx.petersen_graph(), nx.grid_2d_graph(3, 4), nx.path_graph(5)]
+    graphs += [nx.gnp_random_graph(12, 0.25, seed=seed) for seed in range(4)]
+
+    failed = False
+    for g in graphs:
+        cg = CompactGraph.from_networkx(g)
+        for k in range(0, 8):
+            expected = [sum(1 for _ in size_k_masks_rooted_esu(cg, k, v)) for v in range(cg.n)]
+            if count_size_k_connected_sets_per_root(cg, k) != expected:
+                print("ERRONEOUS ON", g.edges, k)
+                failed = True
+
+    cg = CompactGraph.from_networkx(nx.grid_2d_graph(4, 4))
+    if count_size_k_connected_sets_per_root(cg, 6, workers=2) != count_size_k_connected_sets_per_root(cg, 6):
+        print("ERRONEOUS IN PARALLEL")
+        failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_count_size_k_rooted()
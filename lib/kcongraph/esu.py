@@ -0,0 +1,148 @@
+import networkx as nx
+from typing import Iterable, Iterator
+
+if __package__:
+    from lib.kcongraph.compactgraph import CompactGraph, as_compact
+    from lib.kcongraph.parallel import iter_rooted_masks_parallel
+else:
+    from compactgraph import CompactGraph, as_compact
+    from parallel import iter_rooted_masks_parallel
+
+T = int
+
+
+def iter_size_k_connected_masks_esu(
+    G: CompactGraph, k: int, workers: int | None = None
+) -> Iterator[int]:
+    """
+    Lazily yields every connected set of k vertices of G as a vertex bitmask,
+    using the ESU extension-set algorithm of Wernicke.
+
+    With workers > 1 the roots are spread over a pool of worker processes.
+    """
+
+    if workers is not None and workers > 1:
+        yield from iter_rooted_masks_parallel(G, k, size_k_masks_rooted_esu, workers)
+        return
+
+    for v in range(G.n):
+        yield from size_k_masks_rooted_esu(G, k, v)
+
+
+def size_k_masks_rooted_esu(G: CompactGraph, k: int, v: int) -> Iterator[int]:
+    """
+    Yields every connected set of k vertices whose lowest vertex is v.
+
+    A set only ever grows by vertices in its extension set, which holds the
+    remaining candidates of the parent together with the exclusive neighbours of
+    the last added vertex above v, i.e. those not adjacent to anything already
+    in the set. This yields every set exactly once.
+    """
+
+    if k <= 0:
+        return
+    if k == 1:
+        yield 1 << v
+        return
+
+    # Every vertex of the extension set of a set one short of k completes it
+    for sub, ext, _, size in iter_esu_nodes(G, v, k - 1):
+        if size == k - 1:
+            while ext:
+                w = ext & -ext
+                ext ^= w
+                yield sub | w
+
+
+def iter_esu_nodes(G: CompactGraph, v: int, depth: int) -> Iterator[tuple[int, int, int, int]]:
+    """
+    Walks the ESU search tree of the connected sets whose lowest vertex is v,
+    down to sets of depth vertices, and yields every node on the way as
+    (vertex set, extension set, set with its neighbours, size).
+
+    This is the extension loop shared by enumerating, counting and sweeping
+    the connected sets, which differ only in what they do with the nodes.
+    """
+
+    # Only vertices above the root may be added
+    masks = G.masks
+    vbit = 1 << v
+    above = ~((vbit << 1) - 1)
+
+    stack = [(vbit, masks[v] & above, masks[v] | vbit, 1)]
+    while stack:
+        node = stack.pop()
+        yield node
+        sub, ext, nbhd, size = node
+        if size >= depth:
+            continue
+
+        # Extend by each vertex in turn, leaving it out of later extensions
+        while ext:
+            w = ext & -ext
+            ext ^= w
+            wm = masks[w.bit_length() - 1]
+            stack.append((sub | w, ext | (wm & ~nbhd & above), nbhd | wm, size + 1))
+
+
+def size_k_connected_subgraphs_esu(
+    G: nx.Graph | CompactGraph, k: int, workers: int | None = None
+) -> Iterable[Iterable[T]]:
+    return list(iter_size_k_connected_subgraphs_esu(G, k, workers))
+
+
+def iter_size_k_connected_subgraphs_esu(
+    G: nx.Graph | CompactGraph, k: int, workers: int | None = None
+) -> Iterator[Iterable[T]]:
+    cg = as_compact(G)
+    for mask in iter_size_k_connected_masks_esu(cg, k, workers):
+        yield cg.labels_of(mask)
+
+
+def test_size_k_connected_subgraphs_esu():
+
+    if __package__:
+        from lib.kcongraph.consubgraph import size_k_connected_subgraphs_tree
+    else:
+        from consubgraph import size_k_connected_subgraphs_tree
+
+    # Test using brute force
+    def k_connected_bf(G: nx.Graph, k: int) -> list[frozenset[int]]:
+        from itertools import combinations
+
+        cg = CompactGraph.from_networkx(G)
+        combs = combinations(G.nodes, k)
+        return [frozenset(c) for c in combs if cg.is_connected(cg.mask_of(c))]
+
+    # Complete graphs, a few sparse ones and random ones
+    graphs = [nx.complete_graph(n) for n in range(1, 8)]
+    graphs += [nx.petersen_graph(), nx.grid_2d_graph(3, 4), nx.wheel_graph(7)]
+    graphs += [nx.gnp_random_graph(11, 0.3, seed=seed) for seed in range(5)]
+
+    # Test for various graphs
+    from collections import Counter
+
+    failed = False
+    for g in graphs:
+        for k in range(1, min(len(g), 7) + 1):
+            combs_1 = Counter(k_connected_bf(g, k))
+            combs_2 = Counter(map(frozenset, size_k_connected_subgraphs_tree(g, k)))
+            combs_3 = Counter(map(frozenset, size_k_connected_subgraphs_esu(g, k)))
+            if combs_1 != combs_2 or combs_1 != combs_3:
+                print("ERRONEOUS ON")
+                print(g, g.nodes, g.edges, k)
+                print(combs_1)
+                print(combs_3)
+                failed = True
+                break
+        if failed:
+            break
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_size_k_connected_subgraphs_esu()
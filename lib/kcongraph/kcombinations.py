@@ -1,5 +1,7 @@
-from typing import TypeVar, Iterable
+from typing import TypeVar, Iterable, Iterator
 from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import combinations
 
 
 # Representing a Generic Type to represent the set from which we take combinations
@@ -35,8 +37,28 @@ def tree_paths(root: TreeNode, path: list[int]) -> Iterable[list[int]]:
     # Return found paths
     return paths
 
-# Generate all subsets of S of size k
-def k_combinations(k: int, S: list[T]) -> Iterable[Iterable[T]]:
+# Maximal number of (k, S) pairs kept in the fixed-sum table cache
+CACHE_SIZE: int = 1024
+
+
+# Generate all subsets of S of size k, lazily and in lexicographic order
+def k_combinations(k: int, S: list[T]) -> Iterator[tuple[T, ...]]:
+    return combinations(S, k)
+
+
+# Generate all sequences of k positive integers summing to S, in lexicographic order.
+# A sequence is given by k-1 distinct cut points in 1..S-1, so the table is
+# derived from those and shared between all callers.
+@lru_cache(maxsize=CACHE_SIZE)
+def fixed_sum_k_combinations(k: int, S: int) -> tuple[tuple[int, ...], ...]:
+    return tuple(
+        tuple(b - a for a, b in zip((0,) + cuts, cuts + (S,)))
+        for cuts in combinations(range(1, S), k - 1)
+    )
+
+
+# Generate all subsets of S of size k using an explicit combination tree
+def k_combinations_tree(k: int, S: list[T]) -> Iterable[Iterable[T]]:
 
     # Helper function to be called recursively
     def combination_rec(k: int, rest: int, s: int) -> Iterable[TreeNode]:
@@ -76,7 +98,8 @@ def k_combinations(k: int, S: list[T]) -> Iterable[Iterable[T]]:
     return combinations
 
 
-def fixed_sum_k_combinations(k: int, S: int) -> Iterable[Iterable[int]]:
+# Generate all sequences of k positive integers summing to S using an explicit tree
+def fixed_sum_k_combinations_tree(k: int, S: int) -> Iterable[Iterable[int]]:
 
     # Helper function to be called recursively
     def k_sum_rec(k: int, S: int) -> Iterable[TreeNode]:
@@ -116,7 +139,8 @@ def test_k_combinations():
     print("Testing k-combinations")
     S: list[T] = [1, 2, 3, 4, 5]
     for k in range(0, len(S)+1):
-        print(k, k_combinations(k, S))
+        combs = list(map(list, k_combinations(k, S)))
+        print(k, combs, combs == k_combinations_tree(k, S))
 
 
 def test_k_sum_combinations():
@@ -124,9 +148,31 @@ def test_k_sum_combinations():
     print("Testing fixed-sum-l-combinations")
     S: int = 5
     for k in range(1, S+1):
-        print(S,k,fixed_sum_k_combinations(k, S))
+        combs = list(map(list, fixed_sum_k_combinations(k, S)))
+        print(S, k, combs, combs == fixed_sum_k_combinations_tree(k, S))
+
+
+# Micro-benchmark of the table-based functions against the tree-based ones
+def bench_k_combinations(number: int = 2000):
+    from timeit import timeit
+
+    print("Benchmarking k-combinations")
+    S: list[T] = list(range(6))
+    for k in range(1, len(S)+1):
+        t_tree = timeit(lambda: list(k_combinations_tree(k, S)), number=number)
+        t_new = timeit(lambda: list(k_combinations(k, S)), number=number)
+        t_it = timeit(lambda: list(combinations(S, k)), number=number)
+        print(f"k={k} tree {t_tree:.4f}s table {t_new:.4f}s itertools {t_it:.4f}s")
+
+    print("Benchmarking fixed-sum-k-combinations")
+    S: int = 8
+    for k in range(1, S+1):
+        t_tree = timeit(lambda: list(fixed_sum_k_combinations_tree(k, S)), number=number)
+        t_new = timeit(lambda: list(fixed_sum_k_combinations(k, S)), number=number)
+        print(f"S={S} k={k} tree {t_tree:.4f}s table {t_new:.4f}s")
 
 
 if __name__ == "__main__":
     test_k_combinations()
     test_k_sum_combinations()
+    bench_k_combinations()
@@ -0,0 +1,188 @@
+import networkx as nx
+from functools import lru_cache
+from typing import Iterator
+
+if __package__:
+    from lib.kcongraph.compactgraph import CompactGraph
+    from lib.kcongraph.esu import size_k_masks_rooted_esu
+    from lib.kcongraph.parallel import iter_rooted_masks_parallel
+else:
+    from compactgraph import CompactGraph
+    from esu import size_k_masks_rooted_esu
+    from parallel import iter_rooted_masks_parallel
+
+# Largest automorphism group listed element by element. Graphs with larger
+# groups are treated as asymmetric, which is still correct but saves nothing.
+GROUP_LIMIT: int = 10000
+
+
+@lru_cache(maxsize=32)
+def _automorphisms(masks: tuple[int, ...]) -> tuple[tuple[int, ...], ...]:
+    from networkx.algorithms.isomorphism import GraphMatcher
+
+    n = len(masks)
+    H = nx.Graph()
+    H.add_nodes_from(range(n))
+    H.add_edges_from((v, u) for v in range(n) for u in range(v + 1, n) if (masks[v] >> u) & 1)
+
+    group = []
+    for mapping in GraphMatcher(H, H).isomorphisms_iter():
+        group.append(tuple(mapping[v] for v in range(n)))
+        if len(group) > GROUP_LIMIT:
+            return (tuple(range(n)),)
+    return tuple(group)
+
+
+def automorphisms(G: CompactGraph) -> tuple[tuple[int, ...], ...]:
+    """
+    Returns every automorphism of G, including the identity, as the tuple of
+    images of the vertex indices. Computed once per architecture and cached.
+    """
+    return _automorphisms(tuple(G.masks))
+
+
+@lru_cache(maxsize=32)
+def _image_tables(masks: tuple[int, ...]) -> tuple[tuple[tuple[int, ...], ...], ...]:
+    # Per non-identity automorphism and byte of a mask, the images of all 256 values
+    n = len(masks)
+    tables = []
+    for g in _automorphisms(masks):
+        if g == tuple(range(n)):
+            continue
+        chunks = []
+        for c in range(0, n, 8):
+            bits = [1 << g[v] if v < n else 0 for v in range(c, c + 8)]
+            table = [0] * 256
+            for b in range(1, 256):
+                low = b & -b
+                table[b] = table[b ^ low] | bits[low.bit_length() - 1]
+            chunks.append(tuple(table))
+        tables.append(tuple(chunks))
+    return tuple(tables)
+
+
+def apply(g: tuple[int, ...], mask: int) -> int:
+    image = 0
+    while mask:
+        low = mask & -mask
+        image |= 1 << g[low.bit_length() - 1]
+        mask ^= low
+    return image
+
+
+# Mask of the vertices that are the lowest of their orbit
+def vertex_orbit_minima(G: CompactGraph) -> int:
+    return _vertex_orbit_minima(tuple(G.masks))
+
+
+@lru_cache(maxsize=32)
+def _vertex_orbit_minima(masks: tuple[int, ...]) -> int:
+    minima = 0
+    for v in range(len(masks)):
+        if all(g[v] >= v for g in _automorphisms(masks)):
+            minima |= 1 << v
+    return minima
+
+
+def is_orbit_representative(G: CompactGraph, mask: int) -> bool:
+    """
+    Returns whether mask is the lexicographically smallest set of its orbit,
+    comparing sets by their sorted vertices. Of two sets, the smaller one is
+    the one holding the lowest vertex in which they differ.
+    """
+    return _is_representative(_image_tables(tuple(G.masks)), mask)
+
+
+def _is_representative(tables: tuple[tuple[tuple[int, ...], ...], ...], mask: int) -> bool:
+    for chunks in tables:
+        image = 0
+        rest = mask
+        for table in chunks:
+            image |= table[rest & 0xFF]
+            rest >>= 8
+        diff = mask ^ image
+        if diff & -diff & ~mask:
+            return False
+    return True
+
+
+def orbit_size(G: CompactGraph, mask: int) -> int:
+    group = automorphisms(G)
+    stabiliser = sum(1 for g in group if apply(g, mask) == mask)
+    return len(group) // stabiliser
+
+
+def size_k_masks_rooted_orbits(G: CompactGraph, k: int, v: int) -> Iterator[int]:
+    """
+    Yields the orbit representatives among the connected sets of k vertices
+    whose lowest vertex is v. The lowest vertex of a representative is the
+    lowest of its own orbit, so no other root is ever searched.
+    """
+    masks = tuple(G.masks)
+    if not (_vertex_orbit_minima(masks) >> v) & 1:
+        return
+
+    # Without symmetries every set is its own orbit
+    tables = _image_tables(masks)
+    if not tables:
+        yield from size_k_masks_rooted_esu(G, k, v)
+        return
+
+    for mask in size_k_masks_rooted_esu(G, k, v):
+        if _is_representative(tables, mask):
+            yield mask
+
+
+def iter_size_k_connected_masks_orbits(
+    G: CompactGraph, k: int, workers: int | None = None
+) -> Iterator[int]:
+    """
+    Lazily yields one connected set of k vertices of G per orbit under the
+    automorphisms of G, as a vertex bitmask. Every isomorphism class of
+    connected induced subgraphs is still represented.
+
+    With workers > 1 the roots are spread over a pool of worker processes.
+    """
+
+    if workers is not None and workers > 1:
+        yield from iter_rooted_masks_parallel(G, k, size_k_masks_rooted_orbits, workers)
+        return
+
+    for v in range(G.n):
+        yield from size_k_masks_rooted_orbits(G, k, v)
+
+
+def test_orbits():
+
+    if __package__:
+        from lib.kcongraph.esu import iter_size_k_connected_masks_esu
+    else:
+        from esu import iter_size_k_connected_masks_esu
+
+    graphs = [nx.complete_graph(5), nx.petersen_graph(), nx.grid_2d_graph(4, 4)]
+    graphs += [nx.cycle_graph(9), nx.hypercube_graph(3), nx.gnp_random_graph(12, 0.3, seed=2)]
+
+    failed = False
+    for g in graphs:
+        cg = CompactGraph.from_networkx(g)
+        group = automorphisms(cg)
+        for k in range(1, 7):
+            masks = list(iter_size_k_connected_masks_esu(cg, k))
+            representatives = list(iter_size_k_connected_masks_orbits(cg, k))
+
+            # Exactly one representative per orbit, and the orbits cover every set
+            orbits = {min(apply(h, m) for h in group) for m in masks}
+            found = {min(apply(h, m) for h in group) for m in representatives}
+            total = sum(orbit_size(cg, m) for m in representatives)
+            if len(representatives) != len(orbits) or found != orbits or total != len(masks):
+                print("ERRONEOUS ON", g.edges, k)
+                failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_orbits()
@@ -0,0 +1,128 @@
+from typing import Callable, Iterator, TypeAlias
+
+# Function yielding the vertex masks of all sets rooted at a vertex: (G, k, v) -> masks
+Rooted: TypeAlias = Callable[[object, int, int], Iterator[int]]
+
+# Graph of the current worker process, shipped once by the pool initializer
+_graph = None
+
+
+def _init_worker(G) -> None:
+    global _graph
+    _graph = G
+
+
+def _run_root(rooted: Rooted, k: int, v: int) -> tuple[int, list[int]]:
+    return v, list(rooted(_graph, k, v))
+
+
+def iter_rooted_masks_parallel(
+    G, k: int, rooted: Rooted, workers: int
+) -> Iterator[int]:
+    """
+    Yields the vertex masks of rooted(G, k, v) for every vertex v of the
+    CompactGraph G, with one task per root spread over a pool of worker
+    processes. Tasks are handed out one at a time as workers become idle,
+    so a few heavy roots do not hold up the rest, and the sets of each root
+    are yielded as soon as that root is done.
+
+    If the consumer stops early, roots not started yet are dropped and the
+    running ones are left to finish in the background.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(G,))
+    stopped = False
+    try:
+
+        # Lower roots have more vertices available, so submit them first
+        futures = [pool.submit(_run_root, rooted, k, v) for v in range(G.n)]
+        for future in as_completed(futures):
+            _, masks = future.result()
+            yield from masks
+    except GeneratorExit:
+        stopped = True
+        raise
+    finally:
+        pool.shutdown(wait=not stopped, cancel_futures=stopped)
+
+
+def _count_root(counter: Callable[[object, int, int], int], k: int, v: int) -> tuple[int, int]:
+    return v, counter(_graph, k, v)
+
+
+def count_rooted_parallel(
+    G, k: int, counter: Callable[[object, int, int], int], workers: int
+) -> list[int]:
+    """
+    Returns counter(G, k, v) for every vertex v of the CompactGraph G, with
+    one task per root spread over a pool of worker processes like
+    iter_rooted_masks_parallel. Only the counts come back from the workers.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    counts = [0] * G.n
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(G,)
+    ) as pool:
+        futures = [pool.submit(_count_root, counter, k, v) for v in range(G.n)]
+        for future in as_completed(futures):
+            v, count = future.result()
+            counts[v] = count
+    return counts
+
+
+# Root taking a while, for stopping early in test_parallel
+def _slow_root(G, k: int, v: int) -> Iterator[int]:
+    import time
+
+    if v > 0:
+        time.sleep(0.5)
+    yield 1 << v
+
+
+def test_parallel():
+    import networkx as nx
+    from time import perf_counter
+
+    if __package__:
+        from lib.kcongraph.compactgraph import CompactGraph
+        from lib.kcongraph.consubgraph import iter_size_k_connected_masks_tree
+        from lib.kcongraph.esu import iter_size_k_connected_masks_esu
+    else:
+        from compactgraph import CompactGraph
+        from consubgraph import iter_size_k_connected_masks_tree
+        from esu import iter_size_k_connected_masks_esu
+
+    graphs = [nx.petersen_graph(), nx.grid_2d_graph(4, 4), nx.gnp_random_graph(14, 0.3, seed=1)]
+
+    failed = False
+    for g in graphs:
+        cg = CompactGraph.from_networkx(g)
+        for k in range(1, 7):
+            serial = sorted(iter_size_k_connected_masks_tree(cg, k))
+            tree = sorted(iter_size_k_connected_masks_tree(cg, k, workers=2))
+            esu = sorted(iter_size_k_connected_masks_esu(cg, k, workers=2))
+            if serial != tree or serial != esu:
+                print("ERRONEOUS ON")
+                print(g, g.nodes, g.edges, k)
+                failed = True
+
+    # Stopping after the first set does not wait for the remaining roots
+    cg = CompactGraph.from_networkx(nx.path_graph(12))
+    masks = iter_rooted_masks_parallel(cg, 1, _slow_root, 2)
+    first = next(masks)
+    start = perf_counter()
+    masks.close()
+    if first != 1 or perf_counter() - start > 0.4:
+        print("EARLY STOP WAITED", perf_counter() - start)
+        failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_parallel()
@@ -1,4 +1,4 @@
-from typing import Callable, TypeAlias, Iterable, TypeVar
+from typing import Callable, TypeAlias, Iterable, Iterator, TypeVar
 
 # Type aliases used here
 Node: TypeVar = TypeVar("T")
@@ -7,13 +7,26 @@ iSet: TypeAlias = Iterable[Node]
 Set: TypeAlias = Iterable[iSet]
 
 
-# Computes the Refined Union Product as a CSP
+# Computes the Refined Union Product as a CSP. The enumeration uses
+# bitunionprod instead, and this is only kept as the reference its test
+# checks against
 def ref_union_product(
     sets: list[Set],
     vertex_disjoint: Callable[[iSet, iSet], bool],
     hasmark_new: Callable[iSet, bool],
     nochildren_of: Callable[[iSet, iSet], bool],
 ) -> Set:
+    return list(iter_ref_union_product(sets, vertex_disjoint, hasmark_new, nochildren_of))
+
+
+# Lazily yields the Refined Union Product one solution at a time, for the
+# reference above
+def iter_ref_union_product(
+    sets: list[Set],
+    vertex_disjoint: Callable[[iSet, iSet], bool],
+    hasmark_new: Callable[iSet, bool],
+    nochildren_of: Callable[[iSet, iSet], bool],
+) -> Iterator[iSet]:
 
     # Model as a CSP
     import constraint as cst
@@ -34,9 +47,10 @@ def ref_union_product(
 
     # Follow initial constraints
     if maxi == -1:
-        return []
+        return
     if maxi < 1:
-        return sets[maxi]
+        yield from sets[maxi]
+        return
 
     # Model all constraints
     for idx, values in enumerate(sets[: maxi + 1]):
@@ -49,17 +63,13 @@ def ref_union_product(
                 lambda a, b: hasmark_new(b) or nochildren_of(a, b), (idx, jdx)
             )
 
-    # Set of all solutions
-    solutions: Set = []
+    # Yield solutions as the solver finds them
     for solution in problem.getSolutionIter():
 
         # Merge all subsolutions
         # solutions.append(sum(solution.values(), []))
         # Maybe maybe maybe...
-        solutions.append(sum(map(list, solution.values()), []))
-
-    # Return all solutions
-    return solutions
+        yield sum(map(list, solution.values()), [])
 
 
 # Try and test some constraint satisfaction
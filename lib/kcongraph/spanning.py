@@ -0,0 +1,122 @@
+import networkx as nx
+from typing import Iterator
+
+if __package__:
+    from lib.kcongraph.compactgraph import CompactGraph
+else:
+    from compactgraph import CompactGraph
+
+
+def bridges(G: CompactGraph, emask: int) -> int:
+    """
+    Returns the edge mask of the bridges among the edges in emask, i.e. those
+    whose removal disconnects their endpoints, by Tarjan's low-link method.
+    """
+    adjacent: list[list[tuple[int, int]]] = [[] for _ in range(G.n)]
+    for idx in G.indices_of(emask):
+        u, v = G.edges[idx]
+        adjacent[u].append((v, idx))
+        adjacent[v].append((u, idx))
+
+    order = [-1] * G.n
+    low = [0] * G.n
+    found = 0
+    counter = 0
+    for root in range(G.n):
+        if order[root] >= 0:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+
+        # Each entry is (vertex, edge to its parent, position in its edge list)
+        stack = [(root, -1, 0)]
+        while stack:
+            v, parent_edge, pos = stack[-1]
+            if pos < len(adjacent[v]):
+                stack[-1] = (v, parent_edge, pos + 1)
+                w, idx = adjacent[v][pos]
+                if idx == parent_edge:
+                    continue
+                if order[w] < 0:
+                    order[w] = low[w] = counter
+                    counter += 1
+                    stack.append((w, idx, 0))
+                else:
+                    low[v] = min(low[v], order[w])
+                continue
+
+            # All edges of v are done, pass its low-link to the parent
+            stack.pop()
+            if stack:
+                u = stack[-1][0]
+                low[u] = min(low[u], low[v])
+                if low[v] > order[u]:
+                    found |= 1 << parent_edge
+    return found
+
+
+def iter_connected_spanning_edge_masks(G: CompactGraph) -> Iterator[int]:
+    """
+    Lazily yields every edge mask of G whose edges connect all vertices of G,
+    each exactly once, starting with all edges.
+
+    Uses reverse search: the parent of a set is the set plus the lowest edge
+    missing from it. So the children of a set remove one non-bridge edge that
+    is lower than every edge already missing. Removing the missing edges
+    from highest to lowest only passes through supersets of the final set,
+    which are all connected, so every connected set is reached by exactly
+    one path.
+    """
+    if not G.edges_connected((1 << len(G.edges)) - 1):
+        return
+
+    # Each entry is (edge mask, edges that may still be removed)
+    stack = [((1 << len(G.edges)) - 1, (1 << len(G.edges)) - 1)]
+    while stack:
+        emask, removable = stack.pop()
+        yield emask
+
+        candidates = removable & emask & ~bridges(G, emask)
+        while candidates:
+            e = candidates & -candidates
+            candidates ^= e
+            stack.append((emask ^ e, e - 1))
+
+
+def test_iter_connected_spanning_edge_masks():
+
+    # Test using brute force
+    def spanning_bf(cg: CompactGraph) -> list[int]:
+        return [e for e in range(1 << len(cg.edges)) if cg.edges_connected(e)]
+
+    graphs = [nx.complete_graph(n) for n in range(1, 6)]
+    graphs += [nx.petersen_graph(), nx.grid_2d_graph(3, 3), nx.wheel_graph(6), nx.path_graph(5)]
+    graphs += [nx.gnp_random_graph(7, 0.5, seed=seed) for seed in range(6)]
+
+    failed = False
+    for g in graphs:
+        cg = CompactGraph.from_networkx(g)
+        if len(cg.edges) > 16:
+            continue
+        found = list(iter_connected_spanning_edge_masks(cg))
+        if len(found) != len(set(found)) or sorted(found) != spanning_bf(cg):
+            print("ERRONEOUS ON")
+            print(g, g.nodes, g.edges)
+            failed = True
+
+        # Bridges are exactly the edges whose removal disconnects the graph
+        full = (1 << len(cg.edges)) - 1
+        if cg.edges_connected(full):
+            expected = sum(1 << e for e in range(len(cg.edges)) if not cg.edges_connected(full ^ (1 << e)))
+            if bridges(cg, full) != expected:
+                print("WRONG BRIDGES ON", g.edges)
+                failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_iter_connected_spanning_edge_masks()
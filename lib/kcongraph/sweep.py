@@ -0,0 +1,62 @@
+import networkx as nx
+from typing import Iterator
+
+if __package__:
+    from lib.kcongraph.compactgraph import CompactGraph
+    from lib.kcongraph.esu import iter_esu_nodes
+else:
+    from compactgraph import CompactGraph
+    from esu import iter_esu_nodes
+
+
+def iter_connected_masks_upto(G: CompactGraph, k: int) -> Iterator[int]:
+    """
+    Lazily yields every connected vertex set of G with 1 to k vertices, as
+    vertex bitmasks, each exactly once.
+
+    Sets of size s+1 are grown from sets of size s by one vertex of their
+    extension set, as in ESU. That makes every set the child of exactly one
+    canonical parent, so the sets of all sizes come out of a single search
+    tree, and each level is yielded on the way to the next one.
+    """
+
+    if k <= 0:
+        return
+
+    for v in range(G.n):
+        for sub, _, _, _ in iter_esu_nodes(G, v, k):
+            yield sub
+
+
+def test_iter_connected_masks_upto():
+
+    if __package__:
+        from lib.kcongraph.esu import iter_size_k_connected_masks_esu
+    else:
+        from esu import iter_size_k_connected_masks_esu
+
+    graphs = [nx.complete_graph(6), nx.petersen_graph(), nx.grid_2d_graph(3, 4)]
+    graphs += [nx.gnp_random_graph(12, 0.25, seed=seed) for seed in range(4)]
+
+    failed = False
+    for g in graphs:
+        cg = CompactGraph.from_networkx(g)
+        swept = list(iter_connected_masks_upto(cg, 7))
+        if len(swept) != len(set(swept)):
+            print("DUPLICATES ON", g.edges)
+            failed = True
+        for k in range(1, 8):
+            expected = sorted(iter_size_k_connected_masks_esu(cg, k))
+            actual = sorted(m for m in swept if m.bit_count() == k)
+            if expected != actual:
+                print("ERRONEOUS ON", g.edges, k)
+                failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_iter_connected_masks_upto()
@@ -0,0 +1,309 @@
+import os
+import numpy as np
+from bisect import bisect_right
+import networkx as nx
+from array import array
+from typing import Iterable, Iterator, Sequence
+
+if __package__:
+    from lib.kcongraph.compactgraph import CompactGraph
+else:
+    from compactgraph import CompactGraph
+
+# RAM the rows of a store may take before further rows are spilled to disk,
+# overridden by the SUBARCH_SET_BUDGET_MB environment variable
+DEFAULT_BUDGET_MB: int = 1024
+
+# Rows gathered before they are moved into a chunk of their own
+CHUNK_ROWS: int = 1 << 16
+
+
+class VertexSetStore:
+    """
+    Append-only table of vertex sets of equal size k, one row of k unsigned
+    16-bit vertex indices per set, in the order they were added.
+
+    Rows are gathered in a small buffer and moved into chunks of CHUNK_ROWS
+    rows. Chunks stay in RAM until they would exceed budget_mb, after which
+    all further rows go to a temporary file in spill_dir that is memory
+    mapped for reading. Rows, chunks and the spilled part are handed out as
+    NumPy views, without copying them. Reading does not move the buffer
+    into a chunk, its rows are handed out as a copy.
+    """
+
+    def __init__(self, k: int, budget_mb: float | None = None, spill_dir: str | None = None):
+        if budget_mb is None:
+            budget_mb = float(os.environ.get("SUBARCH_SET_BUDGET_MB", DEFAULT_BUDGET_MB))
+        self.k = k
+        self.budget = int(budget_mb * (1 << 20))
+        self.spill_dir = spill_dir
+
+        self._pending = array("H")
+        self._chunks: list[np.ndarray] = []
+        self._starts: list[int] = []
+        self._ram_rows = 0
+        self._spill_file = None
+        self._spill_rows = 0
+        self._spill_map: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return self._ram_rows + self._spill_rows + len(self._pending) // max(self.k, 1)
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill_file is not None
+
+    @property
+    def nbytes(self) -> int:
+        return 2 * self.k * len(self)
+
+    def append(self, vertices: Iterable[int]) -> None:
+        row = array("H", vertices)
+        if len(row) != self.k:
+            raise ValueError(f"Expected {self.k} vertices, got {len(row)}")
+        self._pending.extend(row)
+        self._check_pending()
+
+    def append_mask(self, mask: int) -> None:
+        pending = self._pending
+        added = 0
+        while mask:
+            low = mask & -mask
+            pending.append(low.bit_length() - 1)
+            mask ^= low
+            added += 1
+        if added != self.k:
+            del pending[len(pending) - added :]
+            raise ValueError(f"Expected {self.k} vertices, got {added}")
+        self._check_pending()
+
+    def extend_masks(self, masks: Iterable[int]) -> "VertexSetStore":
+        for mask in masks:
+            self.append_mask(mask)
+        return self
+
+    def _check_pending(self) -> None:
+        if len(self._pending) >= CHUNK_ROWS * self.k:
+            self._flush()
+
+    # Moves the buffered rows into RAM, or to the spill file once over budget
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        rows = np.frombuffer(self._pending, dtype=np.uint16).reshape(-1, self.k)
+        if self._spill_file is None and 2 * self.k * (self._ram_rows + len(rows)) <= self.budget:
+            self._chunks.append(rows.copy())
+            self._starts.append(self._ram_rows)
+            self._ram_rows += len(rows)
+        else:
+            self._spill(rows)
+        del rows
+        self._pending = array("H")
+
+    def _spill(self, rows: np.ndarray) -> None:
+        if self._spill_file is None:
+            import tempfile
+            import weakref
+
+            self._spill_file = tempfile.NamedTemporaryFile(
+                prefix="vertexsets-", suffix=".u16", dir=self.spill_dir, delete=False
+            )
+            weakref.finalize(self, _remove, self._spill_file)
+        self._spill_file.write(rows.tobytes())
+        self._spill_rows += len(rows)
+        self._spill_map = None
+
+    def _spilled_rows(self) -> np.ndarray:
+        if self._spill_map is None:
+            self._spill_file.flush()
+            self._spill_map = np.memmap(
+                self._spill_file.name, dtype=np.uint16, mode="r", shape=(self._spill_rows, self.k)
+            )
+        return self._spill_map
+
+    def _pending_rows(self) -> np.ndarray:
+        return np.frombuffer(self._pending, dtype=np.uint16).reshape(-1, self.k).copy()
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        """
+        Yields the rows as (rows x k) arrays: each chunk kept in RAM, then the
+        whole spilled part as a single memory-mapped array, then the rows
+        still buffered.
+        """
+        yield from self._chunks
+        if self._spill_rows:
+            yield self._spilled_rows()
+        if self._pending:
+            yield self._pending_rows()
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+
+        # Chunks in RAM are found from their first rows, the rest is contiguous
+        if idx < self._ram_rows:
+            chunk = bisect_right(self._starts, idx) - 1
+            return self._chunks[chunk][idx - self._starts[chunk]]
+        idx -= self._ram_rows
+        if idx < self._spill_rows:
+            return self._spilled_rows()[idx]
+        idx -= self._spill_rows
+        return self._pending_rows()[idx]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for chunk in self.chunks():
+            yield from chunk
+
+    def masks(self) -> Iterator[int]:
+        # Rows are converted to Python ints one chunk at a time
+        for chunk in self.chunks():
+            for start in range(0, len(chunk), CHUNK_ROWS):
+                for row in chunk[start : start + CHUNK_ROWS].tolist():
+                    mask = 0
+                    for v in row:
+                        mask |= 1 << v
+                    yield mask
+
+    # Removes the spill file, and with it the rows spilled to it
+    def close(self) -> None:
+        if self._spill_file is not None:
+            self._spill_map = None
+            _remove(self._spill_file)
+            self._spill_file = None
+            self._spill_rows = 0
+
+    def __enter__(self) -> "VertexSetStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _remove(file) -> None:
+    file.close()
+    try:
+        os.remove(file.name)
+    except FileNotFoundError:
+        pass
+
+
+class InducedSubgraphs(Sequence):
+    """
+    Read-only sequence of the induced subgraphs of G on the vertex sets of a
+    store. Every graph is built when it is accessed, so only the rows of the
+    store are kept in memory.
+    """
+
+    def __init__(self, G: CompactGraph, store: VertexSetStore):
+        self.G = G
+        self.store = store
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __iter__(self) -> Iterator[nx.Graph]:
+        for mask in self.store.masks():
+            yield self.G.to_networkx(mask)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return self.G.to_networkx(sum(1 << v for v in self.store[idx].tolist()))
+
+
+def test_vertex_set_store():
+    import random
+
+    if __package__:
+        from lib.kcongraph.esu import iter_size_k_connected_masks_esu
+    else:
+        from esu import iter_size_k_connected_masks_esu
+
+    global CHUNK_ROWS
+    chunk_rows, CHUNK_ROWS = CHUNK_ROWS, 100
+
+    failed = False
+    rng = random.Random(1)
+    masks = [sum(1 << v for v in rng.sample(range(300), 6)) for _ in range(1050)]
+
+    # A budget of a few chunks makes the store spill, without reordering rows
+    for budget_mb in [None, 3 * 100 * 6 * 2 / (1 << 20), 0]:
+        with VertexSetStore(6, budget_mb=budget_mb).extend_masks(masks) as store:
+            if list(store.masks()) != masks or len(store) != len(masks):
+                print("WRONG ROWS WITH BUDGET", budget_mb)
+                failed = True
+            if store.spilled != (budget_mb is not None):
+                print("WRONG SPILLING WITH BUDGET", budget_mb, store.spilled)
+                failed = True
+            if sorted(int(v) for v in next(iter(store))) != sorted(
+                v for v in range(300) if (masks[0] >> v) & 1
+            ):
+                print("WRONG FIRST ROW")
+                failed = True
+
+            # Rows added after reading come after the others
+            store.append_mask(masks[0])
+            if list(store.masks())[-1] != masks[0] or len(store) != len(masks) + 1:
+                print("WRONG APPEND AFTER READING")
+                failed = True
+
+            # Reading between appends leaves the rows in full chunks
+            for mask in masks[:CHUNK_ROWS]:
+                store.append_mask(mask)
+                next(store.chunks())
+            if any(len(chunk) != CHUNK_ROWS for chunk in store._chunks):
+                print("SMALL CHUNKS AFTER READING", [len(chunk) for chunk in store._chunks])
+                failed = True
+
+            # Rows are found by index in RAM, on disk and in the buffer
+            everything = masks + masks[:1] + masks[:CHUNK_ROWS]
+            for idx in [0, 99, 100, 299, 300, 301, 1049, 1050, 1051, -1, -len(everything)]:
+                if sum(1 << int(v) for v in store[idx]) != everything[idx]:
+                    print("WRONG ROW", idx, "WITH BUDGET", budget_mb)
+                    failed = True
+            path = store._spill_file.name if store.spilled else None
+        if path is not None and os.path.exists(path):
+            print("SPILL FILE LEFT BEHIND", path)
+            failed = True
+        if store.spilled or len(store) != store._ram_rows + len(store._pending) // 6:
+            print("SPILLED AFTER CLOSING")
+            failed = True
+
+    try:
+        VertexSetStore(3).append_mask(0b1111)
+        print("ACCEPTED WRONG SIZE")
+        failed = True
+    except ValueError:
+        pass
+
+    # Induced subgraphs are built on access
+    g = nx.petersen_graph()
+    cg = CompactGraph.from_networkx(g)
+    store = VertexSetStore(5).extend_masks(iter_size_k_connected_masks_esu(cg, 5))
+    subgraphs = InducedSubgraphs(cg, store)
+    expected = [cg.to_networkx(m) for m in iter_size_k_connected_masks_esu(cg, 5)]
+    if len(subgraphs) != len(expected) or any(
+        set(a.nodes) != set(b.nodes) or set(a.edges) != set(b.edges) for a, b in zip(subgraphs, expected)
+    ):
+        print("WRONG INDUCED SUBGRAPHS")
+        failed = True
+    if set(subgraphs[-1].edges) != set(expected[-1].edges):
+        print("WRONG INDEXING")
+        failed = True
+
+    CHUNK_ROWS = chunk_rows
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_vertex_set_store()
@@ -0,0 +1,158 @@
+import sys
+from time import perf_counter
+from typing import IO
+
+
+def peak_rss_mb() -> float | None:
+    """
+    Peak resident set size of this process in MiB, or None where the
+    resource module is unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports KiB, macOS bytes
+    if sys.platform == "darwin":
+        return peak / (1 << 20)
+    return peak / (1 << 10)
+
+
+class Progress:
+    """
+    Throttled progress of a single stage. update may be called for every item,
+    but between emissions it only compares the count against a threshold.
+
+    A report is emitted at most once per interval seconds, or once per every
+    items if given. The number of items between clock reads adapts to the
+    observed rate, so the clock is read about ten times per interval.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        stage: str,
+        total: int | None = None,
+        interval: float = 1.0,
+        every: int | None = None,
+        stream: IO[str] | None = None,
+        jsonl: IO[str] | None = None,
+    ):
+        self.label = label
+        self.stage = stage
+        self.total = total
+        self.interval = interval
+        self.every = every
+        self.stream = sys.stderr if stream is None and jsonl is None else stream
+        self.jsonl = jsonl
+
+        self.current = 0
+        self.start = perf_counter()
+        self._last = self.start
+        self._last_count = 0
+        self._next = every if every is not None else 1
+
+    def update(self, current: int) -> None:
+        self.current = current
+        if current < self._next:
+            return
+
+        # Count based throttling emits at fixed steps
+        if self.every is not None:
+            self._next = current + self.every
+            self.emit()
+            return
+
+        # Time based throttling reads the clock about ten times per interval
+        now = perf_counter()
+        rate = (current - self._last_count) / max(now - self._last, 1e-9)
+        self._next = current + max(1, int(rate * self.interval / 10))
+        if now - self._last >= self.interval:
+            self.emit(now)
+
+    def emit(self, now: float | None = None, final: bool = False) -> None:
+        if now is None:
+            now = perf_counter()
+        self._last = now
+        self._last_count = self.current
+
+        elapsed = now - self.start
+        rate = self.current / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total is not None and rate > 0:
+            eta = (self.total - self.current) / rate
+
+        record = {
+            "label": self.label,
+            "stage": self.stage,
+            "current": self.current,
+            "total": self.total,
+            "elapsed": round(elapsed, 3),
+            "rate": round(rate, 1),
+            "eta": None if eta is None else round(eta, 1),
+            "peak_rss_mb": peak_rss_mb(),
+            "final": final,
+        }
+
+        if self.jsonl is not None:
+            import json
+
+            self.jsonl.write(json.dumps(record) + "\n")
+            self.jsonl.flush()
+
+        if self.stream is not None:
+            of = "" if self.total is None else f"/{self.total}"
+            eta_str = "" if eta is None else f", ETA {eta:.0f}s"
+            rss = record["peak_rss_mb"]
+            rss_str = "" if rss is None else f", peak RSS {rss:.0f}MiB"
+            print(
+                f"{self.label} {self.stage} {self.current}{of}"
+                f" ({rate:.0f}/s{eta_str}{rss_str})",
+                file=self.stream,
+                flush=True,
+            )
+
+    def finish(self, current: int | None = None) -> None:
+        if current is not None:
+            self.current = current
+        self.emit(final=True)
+
+
+def test_progress():
+    import io
+    import json
+
+    failed = False
+
+    # Count based throttling emits exactly every given number of items
+    out = io.StringIO()
+    p = Progress("test", "counting", total=1000, every=100, jsonl=out)
+    for i in range(1, 1001):
+        p.update(i)
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    if [r["current"] for r in records] != list(range(100, 1001, 100)):
+        print("WRONG COUNT THROTTLING", [r["current"] for r in records])
+        failed = True
+
+    # Time based throttling emits rarely on a fast loop
+    out = io.StringIO()
+    p = Progress("test", "counting", interval=0.05, stream=out)
+    for i in range(1, 2000001):
+        p.update(i)
+    p.finish()
+    lines = out.getvalue().splitlines()
+    if not 1 <= len(lines) <= 200 or "2000000" not in lines[-1]:
+        print("WRONG TIME THROTTLING", len(lines), lines[-1:])
+        failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_progress()
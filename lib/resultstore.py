@@ -0,0 +1,207 @@
+import networkx as nx
+from typing import Hashable, Iterable
+from array import array
+from lib import instrumentation
+
+# Default location of the store, overridden by the SUBARCH_STORE environment variable
+DEFAULT_PATH: str = ".subarch_store.sqlite"
+
+
+def _node_order(G: nx.Graph) -> list[Hashable]:
+    return sorted(G.nodes, key=repr)
+
+
+def graph_digest(G: nx.Graph) -> str:
+    """
+    Content hash of a labelled coupling graph. Results refer to vertex labels,
+    so the hash covers the labels themselves but not node or edge order.
+    """
+    import hashlib
+
+    nodes = _node_order(G)
+    edges = sorted(tuple(sorted((repr(u), repr(v)))) for u, v in G.edges)
+    h = hashlib.sha256()
+    h.update(repr([repr(v) for v in nodes]).encode())
+    h.update(repr(edges).encode())
+    return h.hexdigest()
+
+
+def encode_graphs(G: nx.Graph, graphs: Iterable[nx.Graph]) -> bytes:
+    """
+    Packs subgraphs of G as the number of graphs, as an unsigned 64-bit
+    integer, followed by unsigned 16-bit indices into the node order of G:
+    per graph its vertex count, vertices, edge count and edge endpoints.
+    """
+    index = {v: i for i, v in enumerate(_node_order(G))}
+    graphs = list(graphs)
+    data = array("H")
+    for g in graphs:
+        data.append(g.number_of_nodes())
+        data.extend(index[v] for v in g.nodes)
+        data.append(g.number_of_edges())
+        for u, v in g.edges:
+            data.append(index[u])
+            data.append(index[v])
+    return array("Q", [len(graphs)]).tobytes() + data.tobytes()
+
+
+def decode_graphs(G: nx.Graph, blob: bytes) -> list[nx.Graph]:
+    nodes = _node_order(G)
+    count = array("Q")
+    count.frombytes(blob[: count.itemsize])
+    data = array("H")
+    data.frombytes(blob[count.itemsize :])
+
+    graphs: list[nx.Graph] = []
+    pos = 0
+    for _ in range(count[0]):
+        g = nx.Graph()
+        n = data[pos]
+        g.add_nodes_from(nodes[i] for i in data[pos + 1 : pos + 1 + n])
+        pos += 1 + n
+        m = data[pos]
+        pos += 1
+        g.add_edges_from(
+            (nodes[data[pos + 2 * e]], nodes[data[pos + 2 * e + 1]]) for e in range(m)
+        )
+        pos += 2 * m
+        graphs.append(g)
+    return graphs
+
+
+class ResultStore:
+    """
+    On-disk store of computed subarchitectures keyed by the content hash of
+    the architecture, the subarchitecture size and the algorithm version.
+
+    Backed by SQLite in WAL mode, so every write is an atomic transaction and
+    several processes on one host can read and write the same store.
+    """
+
+    def __init__(self, path: str | None = None):
+        import os
+
+        if path is None:
+            path = os.environ.get("SUBARCH_STORE", DEFAULT_PATH)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    def _connect(self):
+        import sqlite3
+
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    " arch TEXT, k INTEGER, version INTEGER, kind TEXT, data BLOB,"
+                    " PRIMARY KEY (arch, k, version, kind))"
+                )
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT)"
+                )
+        return self._conn
+
+    def get(self, G: nx.Graph, k: int, version: int, kind: str = "optimal") -> list[nx.Graph] | None:
+        row = self._connect().execute(
+            "SELECT data FROM results WHERE arch=? AND k=? AND version=? AND kind=?",
+            (graph_digest(G), k, version, kind),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            instrumentation.count("result store misses")
+            return None
+        self.hits += 1
+        instrumentation.count("result store hits")
+        return decode_graphs(G, row[0])
+
+    def put(
+        self, G: nx.Graph, k: int, version: int, graphs: Iterable[nx.Graph], kind: str = "optimal"
+    ) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                (graph_digest(G), k, version, kind, encode_graphs(G, graphs)),
+            )
+
+    # Plain key-value entries for results other than subarchitectures
+    def get_value(self, key: str) -> str | None:
+        row = self._connect().execute("SELECT value FROM entries WHERE key=?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def put_value(self, key: str, value: str) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?)", (key, value))
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def test_result_store():
+    import os
+    import tempfile
+
+    failed = False
+    G = nx.relabel_nodes(nx.petersen_graph(), {v: f"q{v}" for v in range(10)})
+
+    def same(a: list[nx.Graph], b: list[nx.Graph]) -> bool:
+        return len(a) == len(b) and all(
+            set(g.nodes) == set(h.nodes) and {frozenset(e) for e in g.edges} == {frozenset(e) for e in h.edges}
+            for g, h in zip(a, b)
+        )
+
+    # Round trips, including more graphs than a 16-bit count holds
+    graphs = [G.subgraph(["q0", "q1", "q2", "q6"]).copy(), G.subgraph(["q3"]).copy(), nx.Graph()]
+    many = [G.subgraph(["q0", "q1"]).copy()] * 70000
+    for gs in [graphs, [], many]:
+        if not same(decode_graphs(G, encode_graphs(G, gs)), gs):
+            print("WRONG ROUND TRIP OF", len(gs), "GRAPHS")
+            failed = True
+
+    # Results are only found for the same architecture, size and version
+    path = os.path.join(tempfile.mkdtemp(), "results.sqlite")
+    store = ResultStore(path)
+    store.put(G, 4, 1, graphs)
+    if not same(store.get(G, 4, 1), graphs):
+        print("WRONG STORED GRAPHS")
+        failed = True
+    changed = G.copy()
+    changed.remove_edge("q0", "q1")
+    for misses, (H, k, version) in enumerate([(G, 5, 1), (G, 4, 2), (changed, 4, 1)], start=1):
+        if store.get(H, k, version) is not None or store.misses != misses:
+            print("WRONG HIT FOR", k, version, H is changed)
+            failed = True
+
+    # Node order does not change the digest, the labels do
+    shuffled = nx.Graph()
+    shuffled.add_nodes_from(reversed(list(G.nodes)))
+    shuffled.add_edges_from((v, u) for u, v in G.edges)
+    if store.get(shuffled, 4, 1) is None or graph_digest(changed) == graph_digest(G):
+        print("WRONG DIGEST")
+        failed = True
+
+    store.put_value("key", "value")
+    if store.get_value("key") != "value" or store.get_value("other") is not None:
+        print("WRONG VALUES")
+        failed = True
+
+    store.close()
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_result_store()
@@ -0,0 +1,183 @@
+import networkx as nx
+from typing import Hashable
+from lib.kcongraph.compactgraph import CompactGraph
+from lib import canonical
+
+
+class Subarchitecture:
+    """
+    Subarchitecture of an architecture, given by its vertices and an edge
+    bitmask over the edge index of the architecture's CompactGraph, which all
+    results of one architecture share.
+
+    embeddings is the number of connected vertex sets of the architecture
+    whose induced subgraph is isomorphic to this one, or None if unknown.
+    The canonical key and the conversions are computed once, when first
+    asked for. Their results are shared, so they must not be modified.
+    """
+
+    __slots__ = ("arch", "vertices", "emask", "embeddings", "_key", "_graph", "_edges", "_qmap")
+
+    def __init__(
+        self, arch: CompactGraph, vertices: tuple[int, ...], emask: int, embeddings: int | None = None
+    ):
+        self.arch = arch
+        self.vertices = vertices
+        self.emask = emask
+        self.embeddings = embeddings
+        self._key = None
+        self._graph = None
+        self._edges = None
+        self._qmap = None
+
+    @classmethod
+    def induced(cls, arch: CompactGraph, mask: int, embeddings: int | None = None) -> "Subarchitecture":
+        emask = 0
+        for u, v in arch.induced_edges(mask):
+            emask |= 1 << arch.edge_index[(u, v)]
+        return cls(arch, tuple(arch.indices_of(mask)), emask, embeddings)
+
+    @classmethod
+    def from_networkx(cls, arch: CompactGraph, g: nx.Graph, embeddings: int | None = None) -> "Subarchitecture":
+        emask = 0
+        for u, v in g.edges:
+            emask |= 1 << arch.edge_index[(arch.index[u], arch.index[v])]
+        return cls(arch, tuple(sorted(arch.index[v] for v in g.nodes)), emask, embeddings)
+
+    @property
+    def n(self) -> int:
+        return len(self.vertices)
+
+    @property
+    def labels(self) -> list[Hashable]:
+        return [self.arch.labels[v] for v in self.vertices]
+
+    def canonical_key(self) -> Hashable:
+        if self._key is None:
+            adj = [0] * self.n
+            for u, v in self.to_edge_list():
+                adj[u] |= 1 << v
+                adj[v] |= 1 << u
+            key = canonical.canonical_key(self.n, adj)
+            self._key = (canonical.backend, key)
+        return self._key
+
+    def to_networkx(self) -> nx.Graph:
+        """
+        Subgraph of the architecture with its original vertex labels.
+        """
+        if self._graph is None:
+            self._graph = self.build_networkx()
+        return self._graph
+
+    # Same graph as to_networkx, built anew and not kept
+    def build_networkx(self) -> nx.Graph:
+        labels = self.arch.labels
+        g = nx.Graph()
+        g.add_nodes_from(labels[v] for v in self.vertices)
+        g.add_edges_from((labels[u], labels[v]) for u, v in self.arch.edges_of(self.emask))
+        return g
+
+    def to_edge_list(self) -> list[tuple[int, int]]:
+        """
+        Edges with the vertices numbered 0..n-1 in the order of vertices.
+        """
+        if self._edges is None:
+            local = {v: i for i, v in enumerate(self.vertices)}
+            self._edges = [(local[u], local[v]) for u, v in self.arch.edges_of(self.emask)]
+        return self._edges
+
+    # Coupling map in both directions, numbered like to_edge_list
+    def to_coupling(self) -> tuple[int, frozenset[tuple[int, int]]]:
+        edges = self.to_edge_list()
+        return self.n, frozenset(edges) | frozenset((v, u) for u, v in edges)
+
+    def to_qmap(self):
+        """
+        qmap architecture with bidirectional couplings, numbered like to_edge_list.
+        """
+        if self._qmap is None:
+            from mqt import qmap
+
+            n, edges = self.to_coupling()
+            self._qmap = qmap.Architecture(n, set(edges))
+        return self._qmap
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Subarchitecture):
+            return NotImplemented
+        return self.vertices == other.vertices and self.emask == other.emask
+
+    def __hash__(self) -> int:
+        return hash((self.vertices, self.emask))
+
+    # Caches are dropped when pickled, the qmap architecture cannot be
+    def __reduce__(self):
+        return (Subarchitecture, (self.arch, self.vertices, self.emask, self.embeddings))
+
+    def __repr__(self) -> str:
+        return f"Subarchitecture(vertices={self.labels}, edges={self.emask.bit_count()}, embeddings={self.embeddings})"
+
+
+def test_subarchitecture():
+    import pickle
+    import sys
+
+    failed = False
+    G = nx.petersen_graph()
+    G = nx.relabel_nodes(G, {v: f"q{v}" for v in G})
+    cg = CompactGraph.from_networkx(G)
+
+    mask = 0b1000111
+    sub = Subarchitecture.induced(cg, mask, embeddings=3)
+    g = sub.to_networkx()
+    expected = cg.to_networkx(mask)
+    if set(g.nodes) != set(expected.nodes) or {frozenset(e) for e in g.edges} != {
+        frozenset(e) for e in expected.edges
+    }:
+        print("WRONG GRAPH", g.edges, expected.edges)
+        failed = True
+    if sub.to_networkx() is not g or sub.to_edge_list() is not sub.to_edge_list():
+        print("CONVERSIONS NOT CACHED")
+        failed = True
+    fresh = Subarchitecture.induced(cg, mask)
+    if fresh.build_networkx() is fresh.build_networkx() or fresh._graph is not None:
+        print("THROWAWAY GRAPH CACHED")
+        failed = True
+
+    # Round trips through networkx and pickle keep the subarchitecture
+    back = Subarchitecture.from_networkx(cg, g, 3)
+    unpickled = pickle.loads(pickle.dumps(sub))
+    if back != sub or unpickled != sub or unpickled.embeddings != 3 or hash(back) != hash(sub):
+        print("WRONG ROUND TRIP")
+        failed = True
+
+    # The edge list is the subgraph on vertices 0..n-1
+    h = nx.Graph(sub.to_edge_list())
+    if sorted(h.nodes) != list(range(sub.n)) or not nx.is_isomorphic(g, h):
+        print("WRONG EDGE LIST", sub.to_edge_list())
+        failed = True
+    n, edges = sub.to_coupling()
+    if n != sub.n or len(edges) != 2 * g.number_of_edges():
+        print("WRONG COUPLING", sub.to_coupling())
+        failed = True
+
+    # Isomorphic subarchitectures share their canonical key
+    other = Subarchitecture.induced(cg, cg.mask_of(["q5", "q7", "q9", "q6"]))
+    if (other.canonical_key() == sub.canonical_key()) != nx.is_isomorphic(other.to_networkx(), g):
+        print("WRONG CANONICAL KEY")
+        failed = True
+
+    # Far smaller than the graph it stands for
+    if sys.getsizeof(sub) + sys.getsizeof(sub.vertices) > 400:
+        print("NOT COMPACT", sys.getsizeof(sub))
+        failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_subarchitecture()
@@ -0,0 +1,211 @@
+# Benchmark suite over the architectures and subarchitecture sizes.
+#
+# Every case (stage, architecture, k) runs in its own process, so caches do not
+# carry over between cases and a case exceeding the timeout is simply killed.
+#
+#   python -m misc.benchmark run results.json
+#   python -m misc.benchmark run results.json --baseline baseline.json
+#   python -m misc.benchmark compare baseline.json results.json
+
+import json
+import sys
+
+
+# Stage name -> function of (architecture, k) returning the result count
+def stages():
+    import lib.algorithm as alg
+
+    return {
+        "tree": lambda G, k: alg.count_size_k_induced_connected_subgraphs_tree(G, k),
+        "count": lambda G, k: sum(alg.count_size_k_connected_per_root(G, k).values()),
+        "bf": lambda G, k: alg.count_size_k_induced_connected_subgraphs_bf(G, k),
+        "ram": lambda G, k: len(alg.size_k_induced_connected_subgraphs_ram(G, k)),
+        "optimal": lambda G, k: len(alg.size_k_optimal_subgraphs_slow(G, k)),
+    }
+
+
+DEFAULT_SIZES = [4, 6, 8]
+DEFAULT_TIMEOUT = 120.0
+DEFAULT_REPEATS = 3
+
+# Address space of a single case in MiB. The timeout only bounds time, and a
+# brute-force case may run out of memory well before it
+DEFAULT_MEMORY_MB = 4096
+
+# Relative slowdown flagged as a regression, and the time below which
+# differences are treated as noise
+DEFAULT_TOLERANCE = 1.25
+NOISE_FLOOR = 0.01
+
+
+def run_case(stage, architecture_name, k, repeats):
+    """
+    Runs a single case in the current process and returns its measurements:
+    the median of repeats timed runs, and the peak traced memory of one more.
+    """
+    import statistics
+    import tracemalloc
+    from time import perf_counter
+
+    import lib.architectures as arch
+
+    fun = stages()[stage]
+    G = arch.build_architecture(architecture_name)
+
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        count = fun(G, k)
+        times.append(perf_counter() - start)
+
+    # Memory is traced separately, since tracing slows everything down
+    tracemalloc.start()
+    fun(G, k)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "status": "ok",
+        "median": statistics.median(times),
+        "times": times,
+        "peak_kib": peak / 1024,
+        "count": count,
+    }
+
+
+def case_key(stage, architecture_name, k):
+    return f"{stage}/{architecture_name}/{k}"
+
+
+def run_suite(architectures, sizes, stage_names, timeout, repeats, memory_mb=DEFAULT_MEMORY_MB):
+    import subprocess
+    from misc.jobrunner import _limit_memory
+
+    results = {}
+    for stage in stage_names:
+        for name in architectures:
+            for k in sizes:
+                key = case_key(stage, name, k)
+                args = [sys.executable, "-m", "misc.benchmark", "case", stage, name, str(k), str(repeats)]
+                if memory_mb is not None and sys.platform != "win32":
+                    args = _limit_memory(args, memory_mb)
+                try:
+                    proc = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    results[key] = {"status": "timeout", "timeout": timeout}
+                    print(f"{key}: timeout after {timeout}s", flush=True)
+                    continue
+
+                if proc.returncode != 0:
+                    error = proc.stderr.strip().splitlines()[-1:]
+                    status = "memory" if error and "MemoryError" in error[0] else "error"
+                    results[key] = {"status": status, "error": error}
+                    print(f"{key}: {status} {error}", flush=True)
+                    continue
+
+                results[key] = json.loads(proc.stdout.strip().splitlines()[-1])
+                res = results[key]
+                print(
+                    f"{key}: {res['count']} in {res['median']:.4f}s, peak {res['peak_kib']:.0f}KiB",
+                    flush=True,
+                )
+    return results
+
+
+def environment():
+    import platform
+
+    return {"python": sys.version.split()[0], "machine": platform.machine(), "system": platform.system()}
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Returns a description of every regression of current against baseline:
+    changed counts, cases no longer finishing and cases slower than tolerance
+    times their baseline median.
+    """
+    regressions = []
+    for key, old in baseline["cases"].items():
+        new = current["cases"].get(key)
+        if new is None or old["status"] != "ok":
+            continue
+        if new["status"] != "ok":
+            regressions.append(f"{key}: {new['status']}, was {old['median']:.4f}s")
+            continue
+        if new["count"] != old["count"]:
+            regressions.append(f"{key}: count {new['count']}, was {old['count']}")
+        if new["median"] > tolerance * old["median"] and new["median"] - old["median"] > NOISE_FLOOR:
+            regressions.append(f"{key}: {new['median']:.4f}s, was {old['median']:.4f}s")
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the subarchitecture pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite and save the results")
+    run.add_argument("output")
+    run.add_argument("--baseline", help="results to flag regressions against")
+    run.add_argument("--architectures", nargs="+")
+    run.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    run.add_argument("--stages", nargs="+", default=["tree", "count", "bf", "ram", "optimal"])
+    run.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    run.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    run.add_argument("--memory", type=int, default=DEFAULT_MEMORY_MB, help="MiB of address space per case")
+    run.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+
+    cmp = commands.add_parser("compare", help="flag regressions between saved results")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+
+    case = commands.add_parser("case", help="run a single case, used by run")
+    case.add_argument("stage")
+    case.add_argument("architecture")
+    case.add_argument("k", type=int)
+    case.add_argument("repeats", type=int)
+
+    args = parser.parse_args()
+
+    if args.command == "case":
+        print(json.dumps(run_case(args.stage, args.architecture, args.k, args.repeats)))
+        return
+
+    if args.command == "run":
+        import lib.architectures as arch
+
+        architectures = args.architectures or list(arch.architecture)
+        cases = run_suite(architectures, args.sizes, args.stages, args.timeout, args.repeats, args.memory)
+        current = {
+            "environment": environment(),
+            "timeout": args.timeout,
+            "repeats": args.repeats,
+            "memory_mb": args.memory,
+            "cases": cases,
+        }
+        with open(args.output, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Saved {len(cases)} cases to {args.output}")
+
+        if args.baseline is None:
+            return
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+
+    regressions = compare(baseline, current, args.tolerance)
+    for line in regressions:
+        print("REGRESSION", line)
+    if regressions:
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Callable
+
+
+# A command to run in its own working directory
+@dataclass
+class Job:
+    args: list[str]
+    cwd: str | None = None
+    name: str = ""
+
+
+# Outcome of a job: ok, failed, timeout or cancelled, with its captured output
+@dataclass
+class JobResult:
+    job: Job
+    status: str = "cancelled"
+    returncode: int | None = None
+    output: str = ""
+    seconds: float = 0.0
+
+
+# Wraps a command so it runs with its address space limited to memory_mb MiB.
+# The limit is set by a small Python launcher that then execs the command, so
+# nothing runs in the forked child before exec, which stays safe with threads
+def _limit_memory(args: list[str], memory_mb: int) -> list[str]:
+    launcher = (
+        "import os, resource, sys; "
+        "limit = int(sys.argv[1]) * (1 << 20); "
+        "resource.setrlimit(resource.RLIMIT_AS, (limit, limit)); "
+        "os.execvp(sys.argv[2], sys.argv[2:])"
+    )
+    return [sys.executable, "-c", launcher, str(memory_mb), *args]
+
+
+# Kills a job along with every process it started, which may hold its output
+# pipe open. On POSIX each job leads a session of its own, see run_jobs
+def _kill(proc: subprocess.Popen) -> None:
+    if sys.platform == "win32":
+        proc.kill()
+        return
+
+    import os
+    import signal
+
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_jobs(
+    jobs: list[Job],
+    workers: int = 1,
+    timeout: float | None = None,
+    memory_mb: int | None = None,
+    stop_when: Callable[[JobResult], bool] | None = None,
+) -> list[JobResult]:
+    """
+    Runs the jobs as subprocesses, at most workers at a time, and returns
+    their results in the order of the jobs.
+
+    Each job gets its working directory passed to the process, a wall-clock
+    timeout in seconds and a limit on its address space in MiB (POSIX only).
+    stdout and stderr are captured together. Once a finished job satisfies
+    stop_when, jobs still running are killed and the rest never start.
+    """
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from time import perf_counter
+
+    results = [JobResult(job) for job in jobs]
+    stop = threading.Event()
+    running: set[subprocess.Popen] = set()
+    lock = threading.Lock()
+
+    limited = memory_mb is not None and sys.platform != "win32"
+
+    def run(idx: int) -> None:
+        result = results[idx]
+        with lock:
+            if stop.is_set():
+                return
+            args = result.job.args
+            if limited:
+                args = _limit_memory(args, memory_mb)
+            proc = subprocess.Popen(
+                args,
+                cwd=result.job.cwd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                start_new_session=sys.platform != "win32",
+            )
+            running.add(proc)
+
+        start = perf_counter()
+        try:
+            result.output, _ = proc.communicate(timeout=timeout)
+            result.status = "ok" if proc.returncode == 0 else "failed"
+        except subprocess.TimeoutExpired:
+            _kill(proc)
+            result.output, _ = proc.communicate()
+            result.status = "timeout"
+        result.seconds = perf_counter() - start
+        result.returncode = proc.returncode
+
+        with lock:
+            running.discard(proc)
+
+            # Killed by another job satisfying stop_when
+            if stop.is_set() and result.status == "failed":
+                result.status = "cancelled"
+                return
+
+            if result.status == "ok" and stop_when is not None and stop_when(result):
+                stop.set()
+                for other in running:
+                    _kill(other)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for future in [pool.submit(run, idx) for idx in range(len(jobs))]:
+            future.result()
+
+    return results
+
+
+def test_run_jobs():
+    from time import perf_counter
+
+    failed = False
+    py = sys.executable
+
+    # Outputs come back in job order, regardless of finishing order
+    jobs = [Job([py, "-c", f"import time; time.sleep({0.3 - 0.1 * i}); print({i})"]) for i in range(3)]
+    results = run_jobs(jobs, workers=3)
+    if [r.output.strip() for r in results] != ["0", "1", "2"] or any(r.status != "ok" for r in results):
+        print("WRONG RESULTS", results)
+        failed = True
+
+    # Working directories are passed per process
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = run_jobs([Job([py, "-c", "import os; print(os.getcwd())"], cwd=tmp)])
+        if results[0].output.strip() != tmp and not results[0].output.strip().endswith(tmp):
+            print("WRONG WORKING DIRECTORY", results[0].output)
+            failed = True
+
+    # Hanging jobs are killed at the timeout
+    results = run_jobs([Job([py, "-c", "import time; time.sleep(10)"])], timeout=0.5)
+    if results[0].status != "timeout" or results[0].seconds > 5:
+        print("TIMEOUT NOT ENFORCED", results[0])
+        failed = True
+
+    # A job proving the answer cancels the rest
+    jobs = [Job([py, "-c", "print('swaps: 0')"])]
+    jobs += [Job([py, "-c", "import time; time.sleep(10)"]) for _ in range(3)]
+    results = run_jobs(jobs, workers=2, stop_when=lambda r: "swaps: 0" in r.output)
+    if results[0].status != "ok" or any(r.status != "cancelled" for r in results[1:]):
+        print("NOT CANCELLED", [r.status for r in results])
+        failed = True
+
+    # Processes started by a job are killed with it, also behind the memory limit
+    spawning = "import subprocess, sys, time; subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(10)']); time.sleep(10)"
+    for memory_mb in [None, 1024]:
+        results = run_jobs([Job([py, "-c", spawning])], timeout=0.5, memory_mb=memory_mb)
+        if results[0].status != "timeout" or results[0].seconds > 5:
+            print("CHILDREN OUTLIVE TIMEOUT", memory_mb, results[0])
+            failed = True
+    jobs = [Job([py, "-c", "import time; time.sleep(0.5); print('swaps: 0')"]), Job([py, "-c", spawning])]
+    start = perf_counter()
+    results = run_jobs(jobs, workers=2, stop_when=lambda r: "swaps: 0" in r.output)
+    if results[1].status != "cancelled" or perf_counter() - start > 5:
+        print("CHILDREN OUTLIVE CANCELLING", [r.status for r in results])
+        failed = True
+
+    # Memory limits make allocating processes fail, and only those
+    if sys.platform != "win32":
+        jobs = [Job([py, "-c", "x = bytearray(1 << 30)"]), Job([py, "-c", "print(len(bytearray(1 << 20)))"])]
+        results = run_jobs(jobs, workers=2, memory_mb=256)
+        if results[0].status != "failed" or results[1].status != "ok" or results[1].output.strip() != str(1 << 20):
+            print("MEMORY LIMIT NOT ENFORCED", [(r.status, r.output) for r in results])
+            failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_run_jobs()
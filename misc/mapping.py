@@ -0,0 +1,272 @@
+# Schedules exact qmap mappings of circuits onto coupling maps over a process pool.
+#
+# qmap architectures are not sent between processes. A job only names a
+# circuit and gives the coupling map as a qubit count and directed edges,
+# and the worker builds the qmap.Architecture itself.
+
+from lib import instrumentation
+
+Coupling = tuple[int, frozenset[tuple[int, int]]]
+
+# Circuits of the current worker process, shipped once by the pool initializer
+_circuits = None
+
+
+# Coupling map of a rustworkx graph of a qmap covering, in both directions
+# like Subarchitecture.to_coupling, so that both share keys up to isomorphism
+def coupling_of_covering_graph(graph) -> Coupling:
+    edges = graph.edge_list()
+    return len(graph.nodes()), frozenset(edges) | frozenset((v, u) for u, v in edges)
+
+
+def map_circuit(qc, coupling: Coupling):
+    """
+    Maps qc exactly onto the coupling map and returns the mapping statistics
+    and the time it took.
+    """
+    from time import perf_counter
+    from mqt import qmap
+
+    n, edges = coupling
+    architecture = qmap.Architecture(n, set(edges))
+    start = perf_counter()
+    comp = qmap.compile(qc, architecture, method="exact", post_mapping_optimizations=False)
+    return comp[1].json()["statistics"], perf_counter() - start
+
+
+def _init_worker(circuits) -> None:
+    global _circuits
+    _circuits = circuits
+
+
+def _run_job(idx: int, circuit: int, coupling: Coupling):
+    return idx, map_circuit(_circuits[circuit], coupling)
+
+
+# Rough cost of a job, the exact mapper is exponential in the qubits and edges
+def _cost(circuits, job: tuple[int, Coupling]) -> tuple[int, int, int]:
+    circuit, (n, edges) = job
+    return (n, len(edges), circuits[circuit].size())
+
+
+def circuit_fingerprint(qc) -> str:
+    import hashlib
+
+    try:
+        from qiskit import qasm2
+
+        text = qasm2.dumps(qc)
+    except ImportError:
+        text = qc.qasm()
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def coupling_key(coupling: Coupling) -> str:
+    """
+    Key of a coupling map that is the same for every relabelling of it. The
+    optimal number of added gates does not depend on the qubit labels, so
+    isomorphic coupling maps share their mapping results. Maps with a
+    one-directional edge are keyed by their labelled edges instead.
+    """
+    from lib import canonical
+
+    n, edges = coupling
+    if any((v, u) not in edges for u, v in edges):
+        return repr((n, sorted(edges)))
+
+    adj = [0] * n
+    for u, v in edges:
+        adj[u] |= 1 << v
+    key = canonical.canonical_key(n, adj)
+    return repr((canonical.backend, key))
+
+
+class MappingCache:
+    """
+    Mapping results keyed by circuit, coupling map up to isomorphism and
+    mapper settings. Kept in memory, and in a ResultStore if one is given so
+    that later runs reuse them. A cached result keeps the time its mapping
+    originally took.
+    """
+
+    def __init__(self, store=None, settings: str = "exact,post_mapping_optimizations=False"):
+        self.store = store
+        self.settings = settings
+        self.table: dict[str, tuple[dict, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, fingerprint: str, coupling: Coupling) -> str:
+        return f"mapping:{self.settings}:{fingerprint}:{coupling_key(coupling)}"
+
+    def lookup(self, key: str) -> tuple[dict, float] | None:
+        res = self.table.get(key)
+        if res is None and self.store is not None:
+            import json
+
+            value = self.store.get_value(key)
+            if value is not None:
+                stats, seconds = json.loads(value)
+                res = self.table[key] = (stats, seconds)
+        if res is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return res
+
+    def store_result(self, key: str, result: tuple[dict, float]) -> None:
+        self.table[key] = result
+        if self.store is not None:
+            import json
+
+            self.store.put_value(key, json.dumps(result))
+
+
+def map_all(
+    circuits: list,
+    jobs: list[tuple[int, Coupling]],
+    workers: int | None = None,
+    cache: MappingCache | None = None,
+) -> list:
+    """
+    Maps every job, given as a circuit index and a coupling map, and returns
+    the statistics and mapping time of each job in the order of the jobs.
+
+    With a cache, jobs already in it and repeats of another job up to
+    isomorphism of the coupling map are not mapped again. With workers > 1
+    the remaining jobs are spread over a pool of worker processes, which
+    receive the circuits once. The costliest jobs are submitted first so a
+    long mapping does not start last and hold up the whole run.
+    """
+    results = [None] * len(jobs)
+
+    # Only the first job of every key is mapped
+    todo = list(range(len(jobs)))
+    keys = None
+    if cache is not None:
+        fingerprints = [circuit_fingerprint(qc) for qc in circuits]
+        keys = [cache.key(fingerprints[circuit], coupling) for circuit, coupling in jobs]
+        todo = []
+        first: dict[str, int] = {}
+        for idx, key in enumerate(keys):
+            if key in first:
+                continue
+            first[key] = idx
+            results[idx] = cache.lookup(key)
+            if results[idx] is None:
+                todo.append(idx)
+
+    if workers is None or workers <= 1:
+        for idx in todo:
+            circuit, coupling = jobs[idx]
+            results[idx] = map_circuit(circuits[circuit], coupling)
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        order = sorted(todo, key=lambda i: _cost(circuits, jobs[i]), reverse=True)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(circuits,)) as pool:
+            futures = [pool.submit(_run_job, i, *jobs[i]) for i in order]
+            for future in as_completed(futures):
+                idx, result = future.result()
+                results[idx] = result
+
+    instrumentation.count("mappings", len(todo))
+    instrumentation.add_time("mapping", sum(results[idx][1] for idx in todo))
+
+    if cache is not None:
+        instrumentation.count("mapping cache hits", len(jobs) - len(todo))
+        for idx in todo:
+            cache.store_result(keys[idx], results[idx])
+
+        # Repeats take the result of the first job with their key
+        for idx, key in enumerate(keys):
+            if results[idx] is None:
+                results[idx] = cache.table[key]
+                cache.hits += 1
+
+    return results
+
+
+def test_mapping_cache():
+    import os
+    import tempfile
+    from lib.resultstore import ResultStore
+
+    global map_circuit, circuit_fingerprint
+
+    # Mapping and fingerprinting are faked, so neither qmap nor qiskit is needed
+    mapped = []
+
+    def fake_map_circuit(qc, coupling):
+        mapped.append((qc, coupling))
+        n, edges = coupling
+        return {"circuit": qc, "qubits": n, "couplings": len(edges)}, 0.5
+
+    real = map_circuit, circuit_fingerprint
+    map_circuit, circuit_fingerprint = fake_map_circuit, str
+
+    # A rustworkx-like graph of a covering, with every edge given once
+    class Covering:
+        def __init__(self, n, edges):
+            self.n, self.edges = n, edges
+
+        def nodes(self):
+            return list(range(self.n))
+
+        def edge_list(self):
+            return list(self.edges)
+
+    def both_ways(n, edges):
+        return n, frozenset(edges) | frozenset((v, u) for u, v in edges)
+
+    failed = False
+
+    # Isomorphic couplings share their key, whether from a covering or not
+    path = both_ways(3, [(0, 1), (1, 2)])
+    relabelled = both_ways(3, [(1, 0), (0, 2)])
+    covering = coupling_of_covering_graph(Covering(3, [(2, 0), (0, 1)]))
+    triangle = both_ways(3, [(0, 1), (1, 2), (2, 0)])
+    if not coupling_key(path) == coupling_key(relabelled) == coupling_key(covering):
+        print("ISOMORPHIC COUPLINGS WITH DIFFERENT KEYS")
+        failed = True
+    if coupling_key(path) == coupling_key(triangle):
+        print("DIFFERENT COUPLINGS WITH THE SAME KEY")
+        failed = True
+
+    # Results come back in the order of the jobs, each distinct job mapped once
+    circuits = ["qc0", "qc1"]
+    jobs = [(1, triangle), (0, path), (0, covering), (1, path), (0, relabelled)]
+    expected = [({"circuit": circuits[c], "qubits": n, "couplings": len(e)}, 0.5) for c, (n, e) in jobs]
+
+    path_db = os.path.join(tempfile.mkdtemp(), "results.sqlite")
+    store = ResultStore(path_db)
+    cache = MappingCache(store)
+    if map_all(circuits, jobs, cache=cache) != expected or len(mapped) != 3:
+        print("WRONG RESULTS", len(mapped))
+        failed = True
+    if map_all(circuits, list(reversed(jobs)), cache=cache) != list(reversed(expected)) or len(mapped) != 3:
+        print("WRONG CACHED RESULTS", len(mapped))
+        failed = True
+
+    # Results persist in the store, but not across mapper settings
+    mapped.clear()
+    if map_all(circuits, jobs, cache=MappingCache(store)) != expected or mapped:
+        print("STORED RESULTS NOT REUSED", len(mapped))
+        failed = True
+    other = MappingCache(store, settings="heuristic")
+    if map_all(circuits, jobs, cache=other) != expected or len(mapped) != 3 or other.misses != 3:
+        print("CACHE NOT INVALIDATED BY SETTINGS", len(mapped))
+        failed = True
+
+    store.close()
+    os.remove(path_db)
+    map_circuit, circuit_fingerprint = real
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_mapping_cache()
@@ -0,0 +1,87 @@
+# Reading the output of Q-Synth runs
+import re
+
+# A line reporting the number of SWAPs as zero, e.g. Q-Synth's
+# "Number of additional swaps: 0"
+ZERO_SWAPS = re.compile(r"(?im)^[^\n\d]*\bswaps?\b[^\n\d]*[:=]\s*0\s*$")
+
+
+def zero_swaps(output: str) -> bool:
+    """
+    Whether the output of a Q-Synth run reports a mapping without any SWAPs.
+    """
+    return ZERO_SWAPS.search(output) is not None
+
+
+def test_zero_swaps():
+    failed = False
+
+    # Output of Q-Synth 5.1 layout synthesis with the settings of experiment.py
+    # (sat model, cd15, bidirectional, no ancillaries) on a 3-qubit path, for
+    # a circuit that fits it and one that needs a SWAP. Verbose runs are shown
+    # without their circuit drawings
+    captured_zero = "Number of additional swaps: 0  \n"
+    captured_one = "Number of additional swaps: 1  \n"
+    verbose_zero = (
+        "Generating twoway SAT encoding, solving with cd15\n"
+        "platform generated: custom\n"
+        "number of physical qubits:  3\n"
+        "Solving for time step:  0\n"
+        "Finished step 0. Time: 0.0000s. Result: True\n"
+        "Encoding+Solving time: 0.039848540000093635\n"
+        "mapped circuit:\n"
+        "Number of additional swaps: 0  \n"
+        "Extraction time: 0.001424746999873605\n"
+        "Finish time: 2026-10-18 11:50:56.852703\n"
+    )
+    verbose_one = (
+        "Generating twoway SAT encoding, solving with cd15\n"
+        "platform generated: custom\n"
+        "number of physical qubits:  3\n"
+        "Solving for time step:  0\n"
+        "Finished step 0. Time: 0.0001s. Result: False\n"
+        "Solving for time step:  1\n"
+        "Finished step 1. Time: 0.0001s. Result: True\n"
+        "Encoding+Solving time: 0.026856553000015992\n"
+        "mapped circuit:\n"
+        "Number of additional swaps: 1  \n"
+        "Extraction time: 0.0014191420000315702\n"
+        "Finish time: 2026-10-18 11:50:57.553449\n"
+    )
+
+    # The captured outputs, along with report lines in other forms
+    zero = [
+        captured_zero,
+        verbose_zero,
+        "Number of swaps: 0\n",
+        "Solving with cd15\nOptimal swaps: 0\nTime: 1.42\n",
+        "SWAPS = 0",
+    ]
+    nonzero = [
+        captured_one,
+        verbose_one,
+        "Number of swaps: 3\n",
+        "Optimal swaps: 10\n",
+        "Number of swaps: 0.5\n",
+        "Trying 0 swaps\nNumber of swaps: 2\n",
+        "swap bound: 0 to 4\nNumber of swaps: 1\n",
+        "Number of CNOTs: 0\nNumber of swaps: 4\n",
+        "",
+    ]
+    for output in zero:
+        if not zero_swaps(output):
+            print("MISSED ZERO SWAPS IN", repr(output))
+            failed = True
+    for output in nonzero:
+        if zero_swaps(output):
+            print("WRONG ZERO SWAPS IN", repr(output))
+            failed = True
+
+    if failed:
+        print("FAILED")
+    else:
+        print("ALL GOOD")
+
+
+if __name__ == "__main__":
+    test_zero_swaps()
@@ -0,0 +1,125 @@
+# Startup benchmark of the experiment.py subcommands.
+#
+# Every subcommand is timed cold in a fresh interpreter under -X importtime,
+# importing experiment plus the modules the subcommand itself imports before
+# doing any work. Subcommands not mapping circuits must stay below the target
+# and must not load the mapping libraries at all.
+#
+#   python -m misc.startup
+#   python -m misc.startup --target 0.4 --top 15
+
+import sys
+
+# Subcommand -> modules imported on top of experiment before any work is done
+SUBCOMMANDS = {
+    "subarchcount": [],
+    "qsynth": ["misc.jobrunner", "misc.qsynth"],
+    "randomcircuit": ["mqt.qmap", "misc.random_qc", "misc.graph_to_arch", "misc.mapping"],
+    "fixedcircuit": ["mqt.qmap", "qiskit", "misc.graph_to_arch", "misc.mapping"],
+}
+
+# Subcommands held to the target, and modules they must never load
+TARGETED = ["subarchcount", "qsynth"]
+FORBIDDEN = ["mqt", "qiskit"]
+
+DEFAULT_TARGET = 0.5
+DEFAULT_REPEATS = 5
+
+
+def parse_importtime(output):
+    """
+    Returns the cumulative import time in seconds of every module listed in
+    the -X importtime output, and the total over the top-level imports.
+    """
+    modules = {}
+    total = 0.0
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        seconds = int(cumulative) / 1e6
+        modules[name.strip()] = seconds
+
+        # Nested imports are indented by two spaces per level
+        if not name[1:].startswith(" "):
+            total += seconds
+    return modules, total
+
+
+def measure(modules, repeats):
+    """
+    Imports experiment and modules in repeats fresh interpreters and returns
+    the fastest run: its wall time, import time and per-module import times.
+    """
+    import os
+    import subprocess
+    from time import perf_counter
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "; ".join(f"import {m}" for m in ["experiment", *modules])
+
+    best = None
+    for _ in range(repeats):
+        start = perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=root,
+            capture_output=True,
+            text=True,
+        )
+        wall = perf_counter() - start
+        if proc.returncode != 0:
+            return {"status": "error", "error": proc.stderr.strip().splitlines()[-1:]}
+
+        loaded, total = parse_importtime(proc.stderr)
+        if best is None or wall < best["wall"]:
+            best = {"status": "ok", "wall": wall, "imports": total, "modules": loaded}
+    return best
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the experiment subcommands")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET, help="seconds allowed for a cold start")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument("--subcommands", nargs="+", default=list(SUBCOMMANDS))
+    args = parser.parse_args()
+
+    problems = []
+    for name in args.subcommands:
+        res = measure(SUBCOMMANDS[name], args.repeats)
+        if res["status"] != "ok":
+            print(f"{name}: error {res['error']}")
+            if name in TARGETED:
+                problems.append(f"{name}: cannot start")
+            continue
+
+        print(f"{name}: {res['wall']:.3f}s wall, {res['imports']:.3f}s importing")
+        top = sorted(
+            ((t, m) for m, t in res["modules"].items() if m.count(".") == 0),
+            reverse=True,
+        )
+        for t, m in top[: args.top]:
+            print(f"    {t:8.4f}s  {m}")
+
+        if name not in TARGETED:
+            continue
+        if res["wall"] > args.target:
+            problems.append(f"{name}: {res['wall']:.3f}s, target {args.target:.3f}s")
+        for m in res["modules"]:
+            if m.split(".")[0] in FORBIDDEN:
+                problems.append(f"{name}: loads {m}")
+
+    for line in problems:
+        print("SLOW STARTUP", line)
+    if problems:
+        sys.exit(1)
+    print("Startup within target")
+
+
+if __name__ == "__main__":
+    main()